@@ -1,95 +1,267 @@
-from youtube_transcript_api import YouTubeTranscriptApi
-from googletrans import Translator
-import requests
 import re
 import os
+import contextlib
+import contextvars
+import html
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
+from metadata import get_metadata_cache
+from metrics import STAGE_FAILURES, record_source, timed
+from scheduler import RETRY_STATUSES, CircuitOpenError
+from search import get_search_index
+from store import get_store
+from transcript import Transcript
+from translation import TranslationEngine, get_translation_memo
+
+# requests, youtube_transcript_api, googletrans and numpy/scipy are imported on first use so that
+# importing this module (and app.py) stays cheap for every worker start
+
+def fetch_errors():
+    # Failures that mean "no usable answer from upstream"; anything else is a bug and should propagate
+    import requests
+    return (requests.RequestException, CircuitOpenError, ValueError)
+
+_fetch_pool = ThreadPoolExecutor(max_workers=int(os.environ.get("FETCH_WORKERS", 16)), thread_name_prefix="fetch")
+
+# One matcher for every accepted form: watch URLs on any youtube.com host (www, m., music.) with v= anywhere
+# in the query, youtu.be links, /shorts/, /live/, /embed/, /v/ and /e/ paths (youtube-nocookie included), and
+# bare IDs on a line of their own. The 11th character of a real ID only ever carries 4 bits, which rejects
+# most 11-character words. Both alternatives start with a literal ("y" or a newline), which lets the regex
+# engine skip ahead quickly when scanning large blocks of text, so callers wrap single strings in newlines.
+VIDEO_ID = r'[0-9A-Za-z_-]{10}[AEIMQUYcgkosw048]'
+VIDEO_ID_PREFIX = (
+    r'youtu(?:be\.com/watch\?v=|\.be/|be\.com/(?:shorts|embed|live|v|e)/'
+    r'|be(?:-nocookie)?\.com\\?/(?:(?:shorts|embed|live|v|e)\\?/|[^\s"\'<>,]*?[?&](?:amp;)?v=)|\.be\\/)'
+)
+VIDEO_ID_TAIL = (
+    rf'({VIDEO_ID})(?![0-9A-Za-z_-])'
+    rf'|\n[ \t"\']*({VIDEO_ID})[ \t"\',]*(?=\r?\n)'
+)
+VIDEO_ID_RE = re.compile(VIDEO_ID_PREFIX + VIDEO_ID_TAIL)
+# Hosts and paths in any case, as browsers accept them (the ID itself stays case-sensitive). Only a fallback:
+# the ignore-case prefix loses the literal "y" the fast matcher above skips ahead on.
+VIDEO_ID_ANYCASE_RE = re.compile(f"(?i:{VIDEO_ID_PREFIX})" + VIDEO_ID_TAIL)
 
 def extract_video_id(url):
-    patterns = [
-        r'(?:v=|\/)([0-9A-Za-z_-]{11}).*',
-        r'(?:embed\/)([0-9A-Za-z_-]{11})',
-        r'^([0-9A-Za-z_-]{11})$'
-    ]
-    for pattern in patterns:
-        match = re.search(pattern, url)
-        if match:
-            return match.group(1)
+    text = f"\n{url.strip()}\n"
+    match = VIDEO_ID_RE.search(text) or VIDEO_ID_ANYCASE_RE.search(text)
+    if match:
+        return match.group(1) or match.group(2)
     return None
 
-def get_video_title(video_id):
-    try:
-        oembed_url = f"https://www.youtube.com/oembed?url=https://www.youtube.com/watch?v={video_id}&format=json"
-        response = requests.get(oembed_url, timeout=10)
-        if response.status_code == 200:
-            title = response.json().get('title', '')
+OEMBED_URL = "https://www.youtube.com/oembed?url=https://www.youtube.com/watch?v={video_id}&format=json"
+WATCH_URL = "https://www.youtube.com/watch?v={video_id}"
+WATCH_HEADERS = {
+    'User-Agent': 'Mozilla/5.0',
+    'Accept-Language': 'en-US,en;q=0.9'
+}
+# Scraped titles, in priority order. <meta name="title"> and <title> sit in the first few KB of a watch page and
+# the player JSON far below, so a streamed scrape normally stops long before the page ends.
+TITLE_PATTERNS = [
+    (re.compile(rb'<meta name="title" content="([^"]+)"'), True),
+    (re.compile(rb'<title>([^<]+)</title>'), True),
+    (re.compile(rb'"title":"([^"]+)"'), False),
+]
+SCRAPE_CHUNK = 16384
+SCRAPE_MAX_BYTES = int(os.environ.get("TITLE_SCRAPE_MAX_BYTES", 1 << 20))
+
+def clean_title(title):
+    return re.sub(r'[<>:"/\\|?*]', '', title).strip()[:100]
+
+class TitleScanner:
+    # Fed the page chunk by chunk; keeps only a small tail so a tag split across two chunks still matches
+    overlap = 2048
+
+    def __init__(self, max_bytes=SCRAPE_MAX_BYTES):
+        self.max_bytes = max_bytes
+        self.read = 0
+        self.tail = b""
+
+    @property
+    def exhausted(self):
+        return self.read >= self.max_bytes
+
+    def feed(self, chunk):
+        window = self.tail + chunk
+        self.read += len(chunk)
+        for pattern, is_html in TITLE_PATTERNS:
+            match = pattern.search(window)
+            if match:
+                title = match.group(1).decode('utf-8', 'replace')
+                title = clean_title((html.unescape(title) if is_html else title).replace(' - YouTube', '').strip())
+                if title:
+                    return title
+        self.tail = window[-self.overlap:]
+        return None
+
+def scrape_title(chunks):
+    scanner = TitleScanner()
+    for chunk in chunks:
+        title = scanner.feed(chunk)
+        if title or scanner.exhausted:
+            return title
+    return None
+
+class TitleLookup:
+    # The title policy shared by get_video_title and AsyncPipeline.get_video_title, which only differ in how
+    # they fetch: the cache first, then oEmbed, then a scrape of the watch page. Resolved titles and definitive
+    # misses are cached in the store; lookups that failed on throttling or network errors are not, so they
+    # are retried on the next request. The methods taking a step's outcome return the title, or None to go on.
+    def __init__(self, video_id, dir_path=None):
+        self.video_id = video_id
+        self.cache = get_metadata_cache(dir_path)
+        self.transient = False
+
+    def cached(self):
+        cached = self.cache.get(self.video_id)
+        if not cached:
+            return None
+        record_source("title", "cache" if cached["title"] else "cache_negative")
+        return cached["title"] or f"video_{self.video_id}"
+
+    def oembed(self, status, data):
+        # `data` is the parsed body of a 200 response
+        if status == 200:
+            title = clean_title(data.get('title', ''))
             if title:
-                return re.sub(r'[<>:"/\\|?*]', '', title).strip()[:100]
-    except:
-        pass
-    # Fallback: scrape
+                record_source("title", "oembed")
+                self.cache.put(self.video_id, title, "oembed", data.get('author_name'))
+                return title
+        self.transient = status in RETRY_STATUSES
+        return None
+
+    def scrape(self, status, title):
+        if title:
+            record_source("title", "scrape")
+            self.cache.put(self.video_id, title, "scrape")
+            return title
+        self.transient = self.transient or status in RETRY_STATUSES
+        return None
+
+    def failed(self, step, error):
+        self.transient = True
+        print(f"Title {step} failed for {self.video_id}: {error!r}")
+
+    def fallback(self):
+        record_source("title", "default")
+        if not self.transient:
+            self.cache.put(self.video_id, None, "missing")
+        return f"video_{self.video_id}"
+
+@timed("title")
+def get_video_title(video_id, dir_path=None):
+    from http_client import get_session
+    lookup = TitleLookup(video_id, dir_path)
+    title = lookup.cached()
+    if title:
+        return title
     try:
-        url = f"https://www.youtube.com/watch?v={video_id}"
-        headers = {
-            'User-Agent': 'Mozilla/5.0',
-            'Accept-Language': 'en-US,en;q=0.9'
-        }
-        response = requests.get(url, headers=headers, timeout=10)
-        if response.status_code == 200:
-            patterns = [
-                r'"title":"([^"]+)"',
-                r'<title>([^<]+)</title>',
-                r'<meta name="title" content="([^"]+)"'
-            ]
-            for pattern in patterns:
-                match = re.search(pattern, response.text)
-                if match:
-                    title = match.group(1).replace(' - YouTube', '').strip()
-                    return re.sub(r'[<>:"/\\|?*]', '', title).strip()[:100]
-    except:
-        pass
-    return f"video_{video_id}"
-
-def get_transcript(video_id):
-    api = YouTubeTranscriptApi()
+        response = get_session().get(OEMBED_URL.format(video_id=video_id))
+        title = lookup.oembed(response.status_code, response.json() if response.status_code == 200 else None)
+        if title:
+            return title
+    except fetch_errors() as e:
+        lookup.failed("lookup via oEmbed", e)
+    # Fallback: scrape, reading only as much of the page as it takes to find the title
     try:
-        transcript = api.fetch(video_id, languages=['en'])
-        return transcript, 'en', False
-    except:
-        try:
-            transcript = api.fetch(video_id)
-            return transcript, 'unknown', True
-        except:
-            return None, None, False
-
-def translate_transcript(transcript_data, source_lang):
-    if source_lang == 'en' or source_lang == 'unknown':
+        with get_session().get(WATCH_URL.format(video_id=video_id), headers=WATCH_HEADERS, stream=True) as response:
+            title = scrape_title(response.iter_content(SCRAPE_CHUNK)) if response.status_code == 200 else None
+            title = lookup.scrape(response.status_code, title)
+            if title:
+                return title
+    except fetch_errors() as e:
+        lookup.failed("scrape", e)
+    return lookup.fallback()
+
+# Track selection order; each step names a kind of track and the first step with a usable track wins:
+#   manual      captions uploaded for English
+#   translated  YouTube's own English translation of an original-language track
+#   generated   English auto-generated captions
+#   source      the original-language track as-is, translated locally afterwards
+TRANSCRIPT_POLICY = [step.strip() for step in os.environ.get(
+    "TRANSCRIPT_POLICY", "manual,translated,generated,source").split(",") if step.strip()]
+# YouTube's BCP-47 style codes where googletrans expects a different one; other codes drop their region
+GOOGLETRANS_CODES = {"zh-Hans": "zh-cn", "zh-Hant": "zh-tw", "zh-CN": "zh-cn", "zh-TW": "zh-tw", "fil": "tl"}
+
+def is_english(lang):
+    return (lang or "").split("-")[0].lower() == "en"
+
+def googletrans_code(lang):
+    return GOOGLETRANS_CODES.get(lang, lang.split("-")[0].lower())
+
+def track_candidates(tracks, policy=None):
+    # Yields (step, track) in policy order from a single listing
+    tracks = list(tracks)
+    manual = [t for t in tracks if not t.is_generated]
+    generated = [t for t in tracks if t.is_generated]
+    english_generated = [t for t in generated if is_english(t.language_code)]
+    for step in policy or TRANSCRIPT_POLICY:
+        if step == "manual":
+            yield from ((step, t) for t in manual if is_english(t.language_code))
+        elif step == "translated":
+            # English auto-captions mean the video is spoken in English, so translating a foreign
+            # auto-generated track would only add a second machine pass; manual originals are still fine
+            originals = manual + ([] if english_generated else generated)
+            yield from ((step, t) for t in originals if not is_english(t.language_code)
+                        and any(lang.language_code == 'en' for lang in t.translation_languages))
+        elif step == "generated":
+            yield from ((step, t) for t in english_generated)
+        elif step == "source":
+            yield from ((step, t) for t in manual + generated if not is_english(t.language_code))
+
+@timed("transcript")
+def get_transcript(video_id, api=None, policy=None):
+    # One listing, then one fetch of the best track. Returns (transcript, source language code, needs_translation):
+    # the code is the spoken language even when YouTube already translated the text to English.
+    from youtube_transcript_api import (
+        CouldNotRetrieveTranscript, NoTranscriptFound, NotTranslatable, RequestBlocked,
+        TranslationLanguageNotAvailable, YouTubeRequestFailed
+    )
+    if api is None:
+        from http_client import get_session
+        from youtube_transcript_api import YouTubeTranscriptApi
+        api = YouTubeTranscriptApi(http_client=get_session())
+    try:
+        for step, track in track_candidates(api.list(video_id), policy):
+            try:
+                fetched = (track.translate('en') if step == "translated" else track).fetch()
+            except (NoTranscriptFound, NotTranslatable, TranslationLanguageNotAvailable):
+                continue
+            record_source("transcript", step)
+            return Transcript.from_segments(fetched), track.language_code, step == "source"
+        raise NoTranscriptFound(video_id, ['en'], [])
+    except (CouldNotRetrieveTranscript, LookupError) + fetch_errors() as e:
+        # Throttling is reported separately from videos that simply have no transcript
+        throttled = isinstance(e, (RequestBlocked, YouTubeRequestFailed) + fetch_errors())
+        record_source("transcript", "throttled" if throttled else "none")
+        STAGE_FAILURES.inc(stage="transcript")
+        print(f"Transcript unavailable for {video_id}: {type(e).__name__}")
+        return None, None, False
+
+def fetch_video(video_id, dir_path=None):
+    title_future = _fetch_pool.submit(contextvars.copy_context().run, get_video_title, video_id, dir_path)
+    transcript = get_transcript(video_id)
+    return title_future.result(), transcript
+
+@timed("translation")
+def translate_transcript(transcript_data, source_lang, progress=None, engine=None, video_id=None, dir_path=None):
+    if is_english(source_lang) or source_lang == 'unknown':
         return transcript_data, False
-    translator = Translator()
-    translated_data = []
-    batch_size = 10
-    for i in range(0, len(transcript_data), batch_size):
-        batch = transcript_data[i:i+batch_size]
-        texts = [item['text'] for item in batch]
-        combined_text = " ".join(texts)
-        try:
-            translated = translator.translate(combined_text, src=source_lang, dest='en')
-            translated_text = translated.text
-        except:
-            translated_text = combined_text
-        translated_texts = translated_text.split(". ")
-        for j, item in enumerate(batch):
-            t_item = item.copy()
-            if j < len(translated_texts):
-                t_item['text'] = translated_texts[j]
-            else:
-                t_item['text'] = item['text']
-            translated_data.append(t_item)
-        print(f"Translating: {min(i + batch_size, len(transcript_data))}/{len(transcript_data)} lines", end='\r')
-    print("\nTranslation complete!")
+    engine = engine or TranslationEngine(memo=get_translation_memo(dir_path))
+    transcript = Transcript.from_segments(transcript_data)
+    report = progress or (lambda stage, done, total: print(f"Translating: {done}/{total} lines", end='\r'))
+    texts = engine.translate_texts(transcript.texts(), googletrans_code(source_lang), 'en', report,
+                                   checkpoint=video_id)
+    translated_data = transcript.with_texts(texts)
+    if not progress:
+        print("\nTranslation complete!")
     return translated_data, True
 
+@timed("format")
 def format_transcript(transcript_data):
+    if isinstance(transcript_data, Transcript):
+        return transcript_data.text()
     texts = []
     for item in transcript_data:
         if isinstance(item, dict):
@@ -98,35 +270,96 @@ def format_transcript(transcript_data):
             texts.append(getattr(item, "text", ""))
     return " ".join(texts)
 
-def summarize_basic(text):
-    sentences = re.split(r'[.!?]+', text)
-    sentences = [s.strip() for s in sentences if len(s.strip()) > 20]
-    total = len(sentences)
-    if total <= 10:
-        key_sentences = sentences
-    else:
-        key_sentences = sentences[:3] + sentences[total//2-2:total//2+2] + sentences[-3:]
+@timed("summarize")
+def summarize_basic(text, num_sentences=None, method=None, backend=None):
+    # Long transcripts are chunked and map-reduced across a process pool; SUMMARY_BACKEND picks the backend
+    from hierarchical import ExtractiveBackend, get_backend, summarize_hierarchical
+    num_sentences = num_sentences or int(os.environ.get("SUMMARY_SENTENCES", 10))
+    backend = backend or (ExtractiveBackend(method) if method else get_backend())
+    key_sentences = summarize_hierarchical(text, num_sentences, backend)
     summary = "\n\n".join(key_sentences)
-    return f"Key Points from Transcript:\n\n{summary}\n\n(Note: Basic summary, no AI.)"
+    return f"Key Points from Transcript:\n\n{summary}\n\n{backend.note}"
 
-def save_transcript(video_title, video_id, source_lang, was_translated, summary, full_transcript, dir_path=None):
+def transcript_path(video_id, dir_path=None, lang='en'):
     if dir_path is None:
         dir_path = os.path.join(os.getcwd(), "transcripts")
     os.makedirs(dir_path, exist_ok=True)
-    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-    filename = os.path.join(dir_path, f"{video_title}_{timestamp}.txt")
-    with open(filename, 'w', encoding='utf-8') as f:
-        f.write(f"YouTube Video: {video_title}\n")
-        f.write(f"Video ID: {video_id}\n")
-        f.write(f"URL: https://www.youtube.com/watch?v={video_id}\n")
-        f.write(f"Original Language: {source_lang}\n")
-        f.write(f"Translated to English: {was_translated}\n")
-        f.write(f"Date Extracted: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}\n\n")
-        f.write("=" * 80 + "\nSUMMARY\n" + "=" * 80 + "\n\n")
-        f.write(summary + "\n\n" + "=" * 80 + "\nFULL TRANSCRIPT\n" + "=" * 80 + "\n\n")
+    return os.path.join(dir_path, f"{video_id}_{lang}.txt")
+
+@contextlib.contextmanager
+def output_file(filename):
+    # Written beside the target and renamed over it, so readers and the compactor never see a half-written
+    # output; a crash leaves a .part file that compaction removes
+    fd, tmp = tempfile.mkstemp(dir=os.path.dirname(filename) or ".", suffix=".part")
+    try:
+        with os.fdopen(fd, 'w', encoding='utf-8') as f:
+            yield f
+        os.chmod(tmp, 0o644)
+        os.replace(tmp, filename)
+    except BaseException:
+        os.unlink(tmp)
+        raise
+
+def write_transcript_header(f, video_title, video_id, source_lang, was_translated, summary):
+    f.write(f"YouTube Video: {video_title}\n")
+    f.write(f"Video ID: {video_id}\n")
+    f.write(f"URL: https://www.youtube.com/watch?v={video_id}\n")
+    f.write(f"Original Language: {source_lang}\n")
+    f.write(f"Translated to English: {was_translated}\n")
+    f.write(f"Date Extracted: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}\n\n")
+    f.write("=" * 80 + "\nSUMMARY\n" + "=" * 80 + "\n\n")
+    f.write(summary + "\n\n" + "=" * 80 + "\nFULL TRANSCRIPT\n" + "=" * 80 + "\n\n")
+
+@timed("save")
+def save_transcript(video_title, video_id, source_lang, was_translated, summary, full_transcript, dir_path=None,
+                    segments=None):
+    # `segments` is the data full_transcript was formatted from; its timings are stored for range queries
+    filename = transcript_path(video_id, dir_path)
+    with output_file(filename) as f:
+        write_transcript_header(f, video_title, video_id, source_lang, was_translated, summary)
         f.write(full_transcript)
+    store_result({
+        "video_id": video_id,
+        "title": video_title,
+        "source_lang": source_lang,
+        "was_translated": was_translated,
+        "filename": filename,
+        "summary": summary,
+        "transcript": full_transcript,
+        "timings": Transcript.from_segments(segments).timings() if segments is not None else None,
+    }, dir_path)
     return filename
 
+def store_result(record, dir_path=None):
+    get_store(dir_path).put(record)
+    get_search_index(dir_path).add(record)
+
+def process_video(video_id, dir_path=None, progress=None):
+    report = progress or (lambda *args: None)
+    report("fetching")
+    video_title, (transcript_data, source_lang, needs_translation) = fetch_video(video_id, dir_path)
+    if not transcript_data:
+        return None
+    # Text YouTube already translated to English arrives with needs_translation False
+    was_translated = not is_english(source_lang)
+    if needs_translation:
+        transcript_data, was_translated = translate_transcript(
+            transcript_data, source_lang, progress, video_id=video_id, dir_path=dir_path)
+    report("summarizing")
+    full_transcript = format_transcript(transcript_data)
+    summary = summarize_basic(full_transcript)
+    report("saving")
+    filename = save_transcript(video_title, video_id, source_lang, was_translated, summary, full_transcript, dir_path,
+                               transcript_data)
+    return {
+        "video_id": video_id,
+        "title": video_title,
+        "source_lang": source_lang,
+        "was_translated": was_translated,
+        "summary": summary,
+        "filename": filename,
+    }
+
 # Main console app
 def main():
     youtube_url = input("Enter YouTube URL or Video ID: ").strip()
@@ -135,19 +368,19 @@ def main():
         print("Invalid URL or Video ID")
         return
     print("Fetching video info...")
-    video_title = get_video_title(video_id)
+    video_title, (transcript_data, source_lang, needs_translation) = fetch_video(video_id)
     print(f"Video title: {video_title}")
-    transcript_data, source_lang, needs_translation = get_transcript(video_id)
     if not transcript_data:
         print("Could not fetch transcript.")
         return
     print(f"Original language: {source_lang}")
-    was_translated = False
-    if source_lang not in ['en', 'unknown']:
-        transcript_data, was_translated = translate_transcript(transcript_data, source_lang)
+    was_translated = not is_english(source_lang)
+    if needs_translation:
+        transcript_data, was_translated = translate_transcript(transcript_data, source_lang, video_id=video_id)
     full_transcript = format_transcript(transcript_data)
     summary = summarize_basic(full_transcript)
-    filename = save_transcript(video_title, video_id, source_lang, was_translated, summary, full_transcript)
+    filename = save_transcript(video_title, video_id, source_lang, was_translated, summary, full_transcript,
+                               segments=transcript_data)
     print(f"Transcript saved to: {filename}")
     print("\nSummary:\n")
     print(summary)
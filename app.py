@@ -1,15 +1,44 @@
-from flask import Flask, request, render_template_string
-from Youtube_transcript_translate import (
-    extract_video_id, get_video_title, get_transcript, 
-    translate_transcript, format_transcript, summarize_basic, save_transcript
-)
+from flask import Flask, Response, g, request, jsonify, send_file, stream_with_context
+from Youtube_transcript_translate import extract_video_id, process_video, summarize_basic
+from cache import LRUCache, ResultCache
+from compaction import get_archive, start_background
+from downloads import MIN_COMPRESS_BYTES, available_encodings, compress_bytes, compressed_variant
+from jobs import JobQueue
+from batch import run_batch
+from streaming import stream_video
+from search import get_search_index
+from singleflight import SingleFlight
+from transcript import parse_timestamp
+import metrics
 
+import gzip
+import hashlib
+import json
 import os
+import time
+from datetime import datetime, timezone
 
 app = Flask(__name__)
+app.logger.setLevel(os.environ.get("LOG_LEVEL", "INFO"))
 
-TRANSCRIPTS_DIR = "/home/bprasana85/video_summarizer/transcripts"
-os.makedirs(TRANSCRIPTS_DIR, exist_ok=True)
+result_cache = ResultCache(
+    max_entries=int(os.environ.get("CACHE_MAX_ENTRIES", 256)),
+    ttl=int(os.environ.get("CACHE_TTL", 3600)),
+)
+job_queue = JobQueue(
+    workers=int(os.environ.get("JOB_WORKERS", 2)),
+    max_jobs=int(os.environ.get("JOB_MAX_RETAINED", 1000)),
+)
+# Decoded segment indexes of stored transcripts, so repeated range queries skip the decompress
+segment_cache = LRUCache(
+    max_entries=int(os.environ.get("SEGMENT_CACHE_ENTRIES", 32)),
+    ttl=int(os.environ.get("CACHE_TTL", 3600)),
+)
+# Lock files coordinate gunicorn workers on the same host; they must share this directory
+flights = SingleFlight(
+    lock_dir=os.environ.get("SINGLEFLIGHT_LOCK_DIR") or os.path.join(os.getcwd(), "transcripts", ".locks"),
+    timeout=float(os.environ.get("SINGLEFLIGHT_TIMEOUT", 600)),
+)
 
 HTML_TEMPLATE = """
 <!doctype html>
@@ -18,44 +47,374 @@ HTML_TEMPLATE = """
 <form method=post>
   YouTube URL or Video ID: <input type=text name=url>
   <input type=submit value=Submit>
+  <button type=button onclick="streamVideo(this.form.url.value)">Stream</button>
 </form>
+<pre id=events></pre>
+<pre id=output style="white-space: pre-wrap"></pre>
+<script>
+function streamVideo(url) {
+  var events = document.getElementById("events"), output = document.getElementById("output");
+  events.textContent = output.textContent = "";
+  var source = new EventSource("/stream?url=" + encodeURIComponent(url));
+  ["stage", "title", "progress", "summary", "error", "done"].forEach(function (name) {
+    source.addEventListener(name, function (e) {
+      var data = JSON.parse(e.data);
+      events.textContent = name + ": " + JSON.stringify(data.summary || data.result || data) + "\n" + events.textContent;
+      if (name === "error" || name === "done") source.close();
+    });
+  });
+  source.addEventListener("text", function (e) { output.textContent += JSON.parse(e.data).text + " "; });
+}
+</script>
 {% if summary %}
 <h2>Summary:</h2>
 <pre>{{ summary }}</pre>
 <p>Transcript saved to: {{ filename }}</p>
+<p><a href="/videos/{{ video_id }}/transcript">Transcript</a>
+  (<a href="/videos/{{ video_id }}/transcript?download=1">download</a>) &middot; <a href="/videos/{{ video_id }}/summary">Summary</a></p>
+{% endif %}
+{% if job_id %}
+<p>Job queued: <a href="/jobs/{{ job_id }}">{{ job_id }}</a></p>
 {% endif %}
 """
 
+# Compiled once at import; each request only renders it
+PAGE = app.jinja_env.from_string(HTML_TEMPLATE)
+EMPTY_PAGE = PAGE.render()
+EMPTY_PAGE_ETAG = hashlib.sha1(EMPTY_PAGE.encode('utf-8')).hexdigest()
+DOWNLOAD_MAX_AGE = int(os.environ.get("DOWNLOAD_MAX_AGE", 300))
+
+def warm_up(connect=True):
+    # Pay the heavy imports (and optionally open the store) before the first request does. Under
+    # gunicorn --preload this runs in the master with connect=False so workers inherit the modules
+    # without sharing a SQLite connection across fork.
+    import googletrans
+    import requests
+    import summarizer
+    import youtube_transcript_api
+    if connect:
+        result_cache.store.count()
+        get_search_index()
+        start_background(logger=app.logger)
+
+def wants_json():
+    return request.is_json or request.accept_mimetypes.best == "application/json"
+
+def log_event(event, **fields):
+    app.logger.info(json.dumps(dict(fields, event=event)))
+
+def flight_key(video_id, lang="en"):
+    return f"{video_id}:{lang}"
+
+def run_video(video_id, progress=None):
+    # Concurrent requests for the same video attach to one pipeline run, in this process or another worker
+    return flights.do(flight_key(video_id), lambda report: run_pipeline(video_id, report), progress,
+                      recheck=lambda: result_cache.get(video_id))
+
+def run_pipeline(video_id, progress=None):
+    start = time.perf_counter()
+    with metrics.collect_timings() as timings:
+        result = process_video(video_id, progress=progress)
+    log_event("pipeline", video_id=video_id, ok=bool(result),
+              seconds=round(time.perf_counter() - start, 4), stages=timings)
+    if not result:
+        raise RuntimeError("Transcript not fetched")
+    result_cache.put(result)
+    app.logger.debug(f"Transcript saved to: {result['filename']}")
+    return result
+
+@app.before_request
+def start_request():
+    g.start = time.perf_counter()
+    g.timings, g.timings_token = metrics.begin_timings()
+    metrics.HTTP_IN_FLIGHT.inc()
+
+@app.after_request
+def finish_request(response):
+    route = request.url_rule.rule if request.url_rule else "unmatched"
+    elapsed = time.perf_counter() - g.start
+    metrics.HTTP_REQUESTS.inc(route=route, method=request.method, status=response.status_code)
+    metrics.HTTP_SECONDS.observe(elapsed, route=route)
+    if route != "/metrics":
+        log_event("request", method=request.method, route=route, status=response.status_code,
+                  seconds=round(elapsed, 4), stages=g.timings)
+    return response
+
+@app.teardown_request
+def teardown(exc):
+    if "timings_token" in g:
+        metrics.end_timings(g.pop("timings_token"))
+        metrics.HTTP_IN_FLIGHT.dec()
+
+def cached_video(video_id):
+    return result_cache.get(video_id) or run_video(video_id)
+
 @app.route("/", methods=["GET", "POST"])
 def index():
     app.logger.debug("Index page accessed")
+    if request.method == "GET":
+        # The empty form never changes, so repeat visitors revalidate against a fixed ETag and get a 304
+        response = Response(EMPTY_PAGE, mimetype="text/html")
+        response.set_etag(EMPTY_PAGE_ETAG)
+        return response.make_conditional(request)
     summary = None
     filename = None
+    job_id = None
+    video_id = None
     if request.method == "POST":
-        url = request.form.get("url", "").strip()
+        if request.is_json:
+            url = str((request.get_json(silent=True) or {}).get("url", "")).strip()
+        else:
+            url = request.form.get("url", "").strip()
         app.logger.debug(f"POST request received with URL: {url}")
         video_id = extract_video_id(url)
         app.logger.debug(f"Extracted video ID: {video_id}")
         if video_id:
-            video_title = get_video_title(video_id)
-            app.logger.debug(f"Video title: {video_title}")
-            transcript_data, source_lang, needs_translation = get_transcript(video_id)
-            if transcript_data:
-                was_translated = False
-                if source_lang not in ['en', 'unknown']:
-                    transcript_data, was_translated = translate_transcript(transcript_data, source_lang)
-                full_transcript = format_transcript(transcript_data)
-                summary = summarize_basic(full_transcript)
-                filename = save_transcript(
-                    video_title, video_id, source_lang, was_translated, summary, full_transcript
-                )
-                app.logger.debug(f"Transcript saved to: {filename}")
+            result = result_cache.get(video_id)
+            if result:
+                app.logger.debug(f"Cache hit for {video_id}")
+                if wants_json():
+                    return jsonify(result)
+                summary = result["summary"]
+                filename = result["filename"]
             else:
-                app.logger.warning("Transcript not fetched")
+                job_id = job_queue.submit_once(flight_key(video_id), run_video, video_id).id
+                app.logger.debug(f"Queued job {job_id} for {video_id}")
+                if wants_json():
+                    return jsonify({"job_id": job_id, "status_url": f"/jobs/{job_id}"}), 202
         else:
             app.logger.warning("Invalid video ID extracted")
-    return render_template_string(HTML_TEMPLATE, summary=summary, filename=filename)
+            if wants_json():
+                return jsonify({"error": "Invalid URL or Video ID"}), 400
+    return PAGE.render(summary=summary, filename=filename, job_id=job_id, video_id=video_id)
+
+@app.route("/jobs/<job_id>")
+def job_status(job_id):
+    job = job_queue.get(job_id)
+    if job is None:
+        return jsonify({"error": "Unknown job"}), 404
+    return jsonify(job.to_dict())
+
+@app.route("/batch", methods=["POST"])
+def batch():
+    data = request.get_json(silent=True)
+    urls = data.get("urls") if isinstance(data, dict) else data
+    if not isinstance(urls, list) or not urls:
+        return jsonify({"error": "Expected a JSON list of URLs or {\"urls\": [...]}"}), 400
+    max_workers = int(os.environ.get("BATCH_MAX_WORKERS", 8))
+    workers = data.get("workers", 4) if isinstance(data, dict) else 4
+    try:
+        workers = max(1, min(int(workers), max_workers))
+    except (TypeError, ValueError):
+        return jsonify({"error": "workers must be an integer"}), 400
+    job = job_queue.submit(run_batch, [str(u) for u in urls], workers=workers, process=cached_video)
+    return jsonify({"job_id": job.id, "status_url": f"/jobs/{job.id}"}), 202
+
+def sse(event):
+    return f"event: {event['event']}\ndata: {json.dumps(event)}\n\n"
+
+@app.route("/stream")
+def stream():
+    video_id = extract_video_id(request.args.get("url", "").strip())
+    if not video_id:
+        return jsonify({"error": "Invalid URL or Video ID"}), 400
+
+    def generate():
+        result = result_cache.get(video_id)
+        if result:
+            yield sse({"event": "summary", "summary": result["summary"]})
+            yield sse({"event": "done", "result": result})
+            return
+        call, leader = flights.begin(flight_key(video_id))
+        if not leader:
+            # Another request is already running this video here: wait for it instead of starting a second run
+            yield sse({"event": "stage", "stage": "waiting"})
+            try:
+                result = call.wait(flights.timeout)
+            except Exception as e:
+                yield sse({"event": "error", "error": f"{type(e).__name__}: {e}"})
+                return
+            yield sse({"event": "summary", "summary": result["summary"]})
+            yield sse({"event": "done", "result": result})
+            return
+        start = time.perf_counter()
+        result = None
+        error = None
+        try:
+            with metrics.collect_timings() as timings:
+                for event in stream_video(video_id):
+                    if event["event"] == "done":
+                        result = event["result"]
+                        result_cache.put(result)
+                    yield sse(event)
+        except Exception as e:
+            # The page's EventSource only closes on error/done; a stream that just ends makes it reconnect
+            # and run the pipeline again
+            error = e
+            app.logger.exception(f"Streaming {video_id} failed")
+            yield sse({"event": "error", "error": f"{type(e).__name__}: {e}"})
+        finally:
+            flights.finish(flight_key(video_id), call, result,
+                           None if result else error or RuntimeError("Stream ended without a result"))
+        log_event("pipeline", video_id=video_id, streamed=True, ok=bool(result),
+                  seconds=round(time.perf_counter() - start, 4), stages=timings)
+
+    return Response(stream_with_context(generate()), mimetype="text/event-stream",
+                    headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+@app.route("/search")
+def search():
+    query = request.args.get("q", "").strip()
+    if not query:
+        return jsonify({"error": "Missing q parameter"}), 400
+    try:
+        limit = max(1, min(int(request.args.get("limit", 20)), 100))
+    except ValueError:
+        return jsonify({"error": "limit must be an integer"}), 400
+    start = time.perf_counter()
+    results = get_search_index().search(query, limit, request.args.get("lang"))
+    return jsonify({"query": query, "results": results, "seconds": round(time.perf_counter() - start, 4)})
+
+def stored_segments(video_id, lang):
+    # Keyed by save time so a re-processed video never serves its old index
+    record = result_cache.store.get(video_id, lang)
+    if record is None:
+        return None
+    key = f"{flight_key(video_id, lang)}:{record['created_at']}"
+    transcript = segment_cache.get(key)
+    if transcript is None:
+        transcript = result_cache.store.get_segments(video_id, lang)
+        if transcript is not None:
+            segment_cache.put(key, transcript)
+    return transcript
+
+@app.route("/videos/<video_id>/range")
+def video_range(video_id):
+    lang = request.args.get("lang", "en")
+    try:
+        start = parse_timestamp(request.args.get("start", 0))
+        end = parse_timestamp(request.args["end"]) if request.args.get("end") else float("inf")
+    except ValueError:
+        return jsonify({"error": "start and end must be seconds or [hh:]mm:ss"}), 400
+    try:
+        sentences = max(1, min(int(request.args.get("sentences", 5)), 50))
+    except ValueError:
+        return jsonify({"error": "sentences must be an integer"}), 400
+    transcript = stored_segments(video_id, lang)
+    if transcript is None:
+        return jsonify({"error": "No timed transcript stored for this video"}), 404
+    part = transcript.between(start, end)
+    result = {"video_id": video_id, "lang": lang, "segments": len(part), "text": part.text()}
+    if len(part):
+        result.update(start=part[0].start, end=part[-1].start + part[-1].duration)
+    if request.args.get("summary") in ("1", "true", "yes"):
+        result["summary"] = summarize_basic(result["text"], sentences) if len(part) else ""
+    return jsonify(result)
+
+def negotiated_encoding(size):
+    if size < MIN_COMPRESS_BYTES:
+        return None
+    return request.accept_encodings.best_match(available_encodings())
+
+def send_saved_file(path, download_name):
+    # Precompressed copies are sent from disk like the original (sendfile under gunicorn), and send_file
+    # answers If-None-Match/If-Modified-Since with 304 and Range with 206 against the chosen representation
+    encoding = negotiated_encoding(os.path.getsize(path))
+    if encoding:
+        path = compressed_variant(path, encoding)
+    response = send_file(path, mimetype="text/plain", conditional=True, etag=True, max_age=DOWNLOAD_MAX_AGE,
+                         as_attachment=request.args.get("download") in ("1", "true", "yes"),
+                         download_name=download_name)
+    if encoding:
+        response.content_encoding = encoding
+    response.vary.add("Accept-Encoding")
+    return response
+
+def send_text(text, record, download_name=None):
+    # For content that only lives in the store: validated by a content hash and the save time
+    data = text.encode('utf-8')
+    etag = hashlib.sha1(data).hexdigest()
+    encoding = negotiated_encoding(len(data))
+    if encoding:
+        data = compress_bytes(data, encoding)
+    # created_at is the saving host's local time; astimezone() reads a naive value as local
+    modified = datetime.strptime(record["created_at"], '%Y-%m-%d %H:%M:%S').astimezone(timezone.utc)
+    return send_data(data, etag, encoding, modified, download_name)
+
+def send_archived(path, download_name):
+    # A saved file the compactor moved into the archive. Its member already is a gzip stream, so gzip
+    # clients get the stored bytes; the validators are the original file's hash and mtime.
+    member, gzipped = get_archive(os.path.dirname(path)).read_raw(os.path.basename(path))
+    if member is None:
+        return None
+    encoding = negotiated_encoding(member["size"])
+    data = gzipped
+    if encoding != "gzip":
+        data = gzip.decompress(gzipped)
+        if encoding:
+            data = compress_bytes(data, encoding)
+    modified = datetime.fromtimestamp(member["mtime_ns"] / 1e9, timezone.utc)
+    return send_data(data, member["sha1"], encoding, modified, download_name)
+
+def send_data(data, etag, encoding, last_modified, download_name=None):
+    response = Response(data, mimetype="text/plain")
+    response.set_etag(f"{etag}-{encoding}" if encoding else etag)
+    response.last_modified = last_modified
+    response.cache_control.max_age = DOWNLOAD_MAX_AGE
+    response.cache_control.public = True
+    if encoding:
+        response.content_encoding = encoding
+    response.vary.add("Accept-Encoding")
+    if download_name and request.args.get("download") in ("1", "true", "yes"):
+        response.headers["Content-Disposition"] = f'attachment; filename="{download_name}"'
+    return response.make_conditional(request, accept_ranges=True, complete_length=len(data))
+
+@app.route("/videos/<video_id>/transcript")
+def video_transcript(video_id):
+    lang = request.args.get("lang", "en")
+    record = result_cache.store.get(video_id, lang)
+    if record is None:
+        return jsonify({"error": "Video not found"}), 404
+    download_name = f"{video_id}_{lang}.txt"
+    if record.get("filename"):
+        if os.path.isfile(record["filename"]):
+            return send_saved_file(record["filename"], download_name)
+        response = send_archived(record["filename"], download_name)
+        if response is not None:
+            return response
+    # The saved file is gone (evicted, or it lives on another host); fall back to the stored text
+    body = result_cache.store.get_transcript(video_id, lang)
+    if body is None:
+        return jsonify({"error": "Transcript not found"}), 404
+    return send_text(body, record, download_name)
+
+@app.route("/videos/<video_id>/summary")
+def video_summary(video_id):
+    record = result_cache.store.get(video_id, request.args.get("lang", "en"))
+    if record is None or record.get("summary") is None:
+        return jsonify({"error": "Video not found"}), 404
+    return send_text(record["summary"], record)
+
+@app.route("/metrics")
+def metrics_endpoint():
+    stats = result_cache.stats()
+    for tier, hits in stats["hits"].items():
+        metrics.CACHE_LOOKUPS.set(hits, result=f"hit_{tier}")
+    metrics.CACHE_LOOKUPS.set(stats["misses"], result="miss")
+    metrics.CACHE_ENTRIES.set(stats["memory_entries"], tier="memory")
+    metrics.CACHE_ENTRIES.set(stats["disk_entries"], tier="disk")
+    for status, count in job_queue.counts().items():
+        metrics.JOBS.set(count, status=status)
+    in_flight = flights.in_flight()
+    metrics.PIPELINES_IN_FLIGHT.set(len(in_flight))
+    metrics.PIPELINE_WAITERS.set(sum(in_flight.values()))
+    return Response(metrics.render(), mimetype="text/plain; version=0.0.4")
+
+@app.route("/cache/stats")
+def cache_stats():
+    return jsonify(result_cache.stats())
 
 if __name__ == "__main__":
         port = int(os.environ.get("PORT", 8080))
+        start_background(logger=app.logger)
         app.run(host="0.0.0.0", port=port)
\ No newline at end of file
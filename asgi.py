@@ -0,0 +1,133 @@
+import json
+import os
+import time
+from urllib.parse import parse_qs
+
+from async_pipeline import AsyncPipeline
+from cache import ResultCache
+from Youtube_transcript_translate import extract_video_id
+import metrics
+
+# Run with: uvicorn asgi:app --host 0.0.0.0 --port $PORT
+# Serves the JSON and streaming endpoints of app.py from one event loop, so videos waiting on the network
+# do not each hold a worker.
+
+pipeline = AsyncPipeline()
+result_cache = ResultCache(
+    max_entries=int(os.environ.get("CACHE_MAX_ENTRIES", 256)),
+    ttl=int(os.environ.get("CACHE_TTL", 3600)),
+)
+
+async def read_body(receive):
+    body = b""
+    while True:
+        message = await receive()
+        body += message.get("body", b"")
+        if not message.get("more_body"):
+            return body
+
+async def send_response(send, status, body, content_type="application/json"):
+    await send({"type": "http.response.start", "status": status,
+                "headers": [(b"content-type", content_type.encode()), (b"content-length", str(len(body)).encode())]})
+    await send({"type": "http.response.body", "body": body})
+
+async def send_json(send, status, data):
+    await send_response(send, status, json.dumps(data).encode('utf-8'))
+    return status
+
+def sse(event):
+    return f"event: {event['event']}\ndata: {json.dumps(event)}\n\n".encode('utf-8')
+
+async def cached_video(video_id, progress=None):
+    result = await pipeline.run_in(pipeline.io, result_cache.get, video_id)
+    if result:
+        return result
+    result = await pipeline.run(video_id, progress)
+    if result:
+        result_cache.put(result)
+    return result
+
+async def index(scope, receive, send):
+    body = await read_body(receive)
+    content_type = dict(scope["headers"]).get(b"content-type", b"")
+    if content_type.startswith(b"application/json"):
+        try:
+            data = json.loads(body or b"{}")
+        except ValueError:
+            data = {}
+        url = str(data.get("url", "") if isinstance(data, dict) else "").strip()
+    else:
+        url = parse_qs(body.decode('utf-8', 'replace')).get("url", [""])[0].strip()
+    video_id = extract_video_id(url)
+    if not video_id:
+        return await send_json(send, 400, {"error": "Invalid URL or Video ID"})
+    try:
+        result = await cached_video(video_id)
+    except Exception as e:
+        return await send_json(send, 502, {"error": f"{type(e).__name__}: {e}"})
+    if not result:
+        return await send_json(send, 502, {"error": "Transcript not fetched"})
+    return await send_json(send, 200, result)
+
+async def stream(scope, receive, send):
+    query = parse_qs(scope.get("query_string", b"").decode('utf-8', 'replace'))
+    video_id = extract_video_id(query.get("url", [""])[0].strip())
+    if not video_id:
+        return await send_json(send, 400, {"error": "Invalid URL or Video ID"})
+    await send({"type": "http.response.start", "status": 200,
+                "headers": [(b"content-type", b"text/event-stream"), (b"cache-control", b"no-cache"),
+                            (b"x-accel-buffering", b"no")]})
+    result = await pipeline.run_in(pipeline.io, result_cache.get, video_id)
+    if result:
+        events = [{"event": "summary", "summary": result["summary"]}, {"event": "done", "result": result}]
+        for event in events:
+            await send({"type": "http.response.body", "body": sse(event), "more_body": True})
+    else:
+        async for event in pipeline.stream(video_id):
+            if event["event"] == "done":
+                result_cache.put(event["result"])
+            await send({"type": "http.response.body", "body": sse(event), "more_body": True})
+    await send({"type": "http.response.body", "body": b""})
+    return 200
+
+async def metrics_endpoint(scope, receive, send):
+    await send_response(send, 200, metrics.render().encode('utf-8'), "text/plain; version=0.0.4")
+    return 200
+
+ROUTES = {
+    ("POST", "/"): index,
+    ("GET", "/stream"): stream,
+    ("GET", "/metrics"): metrics_endpoint,
+}
+
+async def lifespan(receive, send):
+    while True:
+        message = await receive()
+        if message["type"] == "lifespan.startup":
+            await pipeline.start()
+            await send({"type": "lifespan.startup.complete"})
+        elif message["type"] == "lifespan.shutdown":
+            await pipeline.close()
+            await send({"type": "lifespan.shutdown.complete"})
+            return
+
+async def app(scope, receive, send):
+    if scope["type"] == "lifespan":
+        return await lifespan(receive, send)
+    if scope["type"] != "http":
+        return
+    handler = ROUTES.get((scope["method"], scope["path"]))
+    route = scope["path"] if handler else "unmatched"
+    start = time.perf_counter()
+    metrics.HTTP_IN_FLIGHT.inc()
+    status = 500
+    try:
+        with metrics.collect_timings():
+            if handler is None:
+                status = await send_json(send, 404, {"error": "Not found"})
+            else:
+                status = await handler(scope, receive, send)
+    finally:
+        metrics.HTTP_IN_FLIGHT.dec()
+        metrics.HTTP_REQUESTS.inc(route=route, method=scope["method"], status=status)
+        metrics.HTTP_SECONDS.observe(time.perf_counter() - start, route=route)
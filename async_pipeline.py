@@ -0,0 +1,167 @@
+import asyncio
+import contextvars
+import functools
+import os
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlsplit
+
+from Youtube_transcript_translate import (
+    OEMBED_URL, WATCH_HEADERS, WATCH_URL, TitleLookup, TitleScanner, format_transcript, get_transcript,
+    is_english, save_transcript, summarize_basic, translate_transcript
+)
+from metrics import timed
+from scheduler import CircuitOpenError, get_scheduler, retry_after
+
+def transport_errors():
+    # httpx 0.13 re-exports httpcore's network and timeout errors, which do not derive from httpx.HTTPError
+    import httpx
+    return (httpx.NetworkError, httpx.ConnectTimeout, httpx.ReadTimeout, httpx.WriteTimeout, httpx.PoolTimeout)
+
+class AsyncPipeline:
+    # Title lookups are awaited on the event loop through an httpx AsyncClient. The transcript API and
+    # googletrans only ship blocking clients, so those calls (and saving) run on a bounded I/O pool, and
+    # summarization runs on a separate CPU pool so it never stalls the loop.
+    def __init__(self, dir_path=None, io_workers=None, cpu_workers=None, scheduler=None, timeout=10.0):
+        self.dir_path = dir_path
+        io_workers = io_workers or int(os.environ.get("ASYNC_IO_WORKERS", 32))
+        cpu_workers = cpu_workers or int(os.environ.get("ASYNC_CPU_WORKERS", os.cpu_count() or 2))
+        self.io = ThreadPoolExecutor(max_workers=io_workers, thread_name_prefix="aio")
+        self.cpu = ThreadPoolExecutor(max_workers=cpu_workers, thread_name_prefix="acpu")
+        self.scheduler = scheduler or get_scheduler()
+        self.timeout = timeout
+        self.client = None
+        self._inflight = {}
+
+    async def start(self):
+        import httpx
+        if self.client is None:
+            self.client = httpx.AsyncClient(timeout=self.timeout)
+
+    async def close(self):
+        if self.client is not None:
+            await self.client.aclose()
+            self.client = None
+        self.io.shutdown(wait=False)
+        self.cpu.shutdown(wait=False)
+
+    def run_in(self, pool, fn, *args, **kwargs):
+        # copy_context carries the request's stage timings into the worker thread
+        ctx = contextvars.copy_context()
+        return asyncio.get_running_loop().run_in_executor(pool, functools.partial(ctx.run, fn, *args, **kwargs))
+
+    async def _get(self, url, **kwargs):
+        await self.start()
+        return await self.scheduler.acall(urlsplit(url).netloc, lambda: self.client.get(url, **kwargs),
+                                          throttled=retry_after, retry_on=transport_errors())
+
+    async def _scrape(self, url, **kwargs):
+        # Streams the page and leaves the body unread once the title turns up; returns (response, title)
+        async def scrape():
+            async with self.client.stream("GET", url, **kwargs) as response:
+                if response.status_code != 200:
+                    return response, None
+                scanner = TitleScanner()
+                async for chunk in response.aiter_bytes():
+                    title = scanner.feed(chunk)
+                    if title or scanner.exhausted:
+                        return response, title
+                return response, None
+
+        await self.start()
+        return await self.scheduler.acall(urlsplit(url).netloc, scrape, throttled=lambda r: retry_after(r[0]),
+                                          retry_on=transport_errors())
+
+    async def get_video_title(self, video_id):
+        # TitleLookup's policy; its cache reads and writes run on the I/O pool, off the event loop
+        import httpx
+        errors = (httpx.HTTPError, CircuitOpenError, ValueError) + transport_errors()
+        lookup = TitleLookup(video_id, self.dir_path)
+        with timed("title"):
+            title = await self.run_in(self.io, lookup.cached)
+            if title:
+                return title
+            try:
+                response = await self._get(OEMBED_URL.format(video_id=video_id))
+                data = response.json() if response.status_code == 200 else None
+                title = await self.run_in(self.io, lookup.oembed, response.status_code, data)
+                if title:
+                    return title
+            except errors as e:
+                lookup.failed("lookup via oEmbed", e)
+            try:
+                response, title = await self._scrape(WATCH_URL.format(video_id=video_id), headers=WATCH_HEADERS)
+                title = await self.run_in(self.io, lookup.scrape, response.status_code, title)
+                if title:
+                    return title
+            except errors as e:
+                lookup.failed("scrape", e)
+            return await self.run_in(self.io, lookup.fallback)
+
+    async def fetch_video(self, video_id):
+        return await asyncio.gather(self.get_video_title(video_id), self.run_in(self.io, get_transcript, video_id))
+
+    async def process(self, video_id, progress=None):
+        loop = asyncio.get_running_loop()
+        report = progress or (lambda *args: None)
+        report("fetching")
+        video_title, (transcript_data, source_lang, needs_translation) = await self.fetch_video(video_id)
+        if not transcript_data:
+            return None
+        was_translated = not is_english(source_lang)
+        if needs_translation:
+            report("translating")
+            # Progress arrives from the translation threads and is handed back to the loop
+            threadsafe = lambda *args: loop.call_soon_threadsafe(report, *args)
+            transcript_data, was_translated = await self.run_in(
+                self.io, translate_transcript, transcript_data, source_lang, threadsafe,
+                video_id=video_id, dir_path=self.dir_path)
+        report("summarizing")
+        full_transcript = format_transcript(transcript_data)
+        summary = await self.run_in(self.cpu, summarize_basic, full_transcript)
+        report("saving")
+        filename = await self.run_in(self.io, save_transcript, video_title, video_id, source_lang, was_translated,
+                                     summary, full_transcript, self.dir_path, transcript_data)
+        return {
+            "video_id": video_id,
+            "title": video_title,
+            "source_lang": source_lang,
+            "was_translated": was_translated,
+            "summary": summary,
+            "filename": filename,
+        }
+
+    async def run(self, video_id, progress=None):
+        # Concurrent requests for the same video await one task; shield() keeps it running if a caller goes away
+        key = f"{video_id}:en"
+        task = self._inflight.get(key)
+        if task is None:
+            task = self._inflight[key] = asyncio.ensure_future(self.process(video_id, progress))
+            task.add_done_callback(lambda t: self._inflight.pop(key, None))
+        return await asyncio.shield(task)
+
+    async def stream(self, video_id):
+        queue = asyncio.Queue()
+
+        def progress(stage, done=None, total=None):
+            if done is None:
+                queue.put_nowait({"event": "stage", "stage": stage})
+            else:
+                queue.put_nowait({"event": "progress", "stage": stage, "done": done, "total": total})
+
+        task = asyncio.ensure_future(self.run(video_id, progress))
+        task.add_done_callback(lambda t: queue.put_nowait(None))
+        while True:
+            event = await queue.get()
+            if event is None:
+                break
+            yield event
+        try:
+            result = task.result()
+        except Exception as e:
+            yield {"event": "error", "error": f"{type(e).__name__}: {e}"}
+            return
+        if not result:
+            yield {"event": "error", "error": "Transcript not fetched"}
+            return
+        yield {"event": "summary", "summary": result["summary"]}
+        yield {"event": "done", "result": result}
@@ -0,0 +1,110 @@
+import argparse
+import json
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import datetime
+
+from Youtube_transcript_translate import extract_video_id, process_video
+
+def load_urls(source):
+    if isinstance(source, (list, tuple)):
+        return [str(u) for u in source]
+    if source == "-":
+        text = sys.stdin.read()
+    else:
+        with open(source, encoding='utf-8') as f:
+            text = f.read()
+    try:
+        data = json.loads(text)
+    except ValueError:
+        data = None
+    if isinstance(data, dict):
+        data = data.get("urls")
+    if isinstance(data, list):
+        return [str(u) for u in data]
+    return [line.strip() for line in text.splitlines() if line.strip() and not line.lstrip().startswith("#")]
+
+def dedupe_video_ids(urls):
+    video_ids = []
+    invalid = []
+    seen = set()
+    for url in urls:
+        video_id = extract_video_id(url.strip())
+        if not video_id:
+            invalid.append(url)
+        elif video_id not in seen:
+            seen.add(video_id)
+            video_ids.append(video_id)
+    return video_ids, invalid
+
+def _run_one(process, video_id, batch_start):
+    start = time.perf_counter()
+    entry = {"video_id": video_id, "started_at": round(start - batch_start, 3)}
+    try:
+        result = process(video_id)
+        if result:
+            entry.update(status="ok", title=result.get("title"), filename=result.get("filename"))
+        else:
+            entry.update(status="failed", error="Transcript not fetched")
+    except Exception as e:
+        entry.update(status="failed", error=f"{type(e).__name__}: {e}")
+    entry["seconds"] = round(time.perf_counter() - start, 3)
+    return entry
+
+def run_batch(urls, workers=4, dir_path=None, manifest_path=None, process=None, progress=None):
+    if process is None:
+        process = lambda video_id: process_video(video_id, dir_path)
+    if dir_path is None:
+        dir_path = os.path.join(os.getcwd(), "transcripts")
+    video_ids, invalid = dedupe_video_ids(urls)
+    started = datetime.now()
+    batch_start = time.perf_counter()
+    entries = {}
+    with ThreadPoolExecutor(max_workers=max(1, workers), thread_name_prefix="batch") as pool:
+        futures = [pool.submit(_run_one, process, video_id, batch_start) for video_id in video_ids]
+        for future in as_completed(futures):
+            entry = future.result()
+            entries[entry["video_id"]] = entry
+            if progress:
+                progress("batch", len(entries), len(video_ids))
+    elapsed = time.perf_counter() - batch_start
+    videos = [entries[video_id] for video_id in video_ids]
+    succeeded = sum(1 for v in videos if v["status"] == "ok")
+    manifest = {
+        "started": started.strftime('%Y-%m-%d %H:%M:%S'),
+        "seconds": round(elapsed, 3),
+        "workers": workers,
+        "total": len(videos),
+        "succeeded": succeeded,
+        "failed": len(videos) - succeeded,
+        "videos_per_minute": round(len(videos) / elapsed * 60, 2) if elapsed else None,
+        "invalid": invalid,
+        "videos": videos,
+    }
+    if manifest_path is None:
+        os.makedirs(dir_path, exist_ok=True)
+        manifest_path = os.path.join(dir_path, f"manifest_{started.strftime('%Y%m%d_%H%M%S')}.json")
+    with open(manifest_path, 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, indent=2)
+    manifest["manifest"] = manifest_path
+    return manifest
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Summarize a list of YouTube videos concurrently.")
+    parser.add_argument("source", help="File with one URL/ID per line or a JSON list, '-' for stdin")
+    parser.add_argument("-w", "--workers", type=int, default=int(os.environ.get("BATCH_WORKERS", 4)))
+    parser.add_argument("-o", "--out", default=None, help="Output directory for transcripts")
+    parser.add_argument("-m", "--manifest", default=None, help="Manifest path (default: <out>/manifest_<timestamp>.json)")
+    args = parser.parse_args(argv)
+    urls = load_urls(args.source)
+    progress = lambda stage, done, total: print(f"Processed: {done}/{total} videos", end='\r')
+    manifest = run_batch(urls, args.workers, args.out, args.manifest, progress=progress)
+    print(f"\n{manifest['succeeded']}/{manifest['total']} succeeded in {manifest['seconds']}s "
+          f"({len(manifest['invalid'])} invalid)")
+    print(f"Manifest saved to: {manifest['manifest']}")
+    return 0 if manifest["failed"] == 0 else 1
+
+if __name__ == "__main__":
+    sys.exit(main())
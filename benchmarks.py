@@ -0,0 +1,218 @@
+import argparse
+import gc
+import io
+import json
+import math
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+
+from fakes import FakeTranscriptApi, FakeTranslator, synthetic_segments
+from ingest import ingest
+from transcript import Transcript
+from translation import TranslationEngine
+from Youtube_transcript_translate import (
+    extract_video_id, format_transcript, get_transcript, save_transcript, summarize_basic,
+    translate_transcript
+)
+
+DEFAULT_SIZES = [100, 1000, 10000, 50000, 200000]
+DEFAULT_BASELINE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "benchmarks_baseline.json")
+
+# Runs in a fresh interpreter: time `import app`, then the first request served by that worker
+COLD_START_SCRIPT = """
+import json, sys, time
+start = time.perf_counter()
+import app
+imported = time.perf_counter()
+response = app.app.test_client().get("/")
+assert response.status_code == 200, response.status_code
+done = time.perf_counter()
+heavy = [m for m in ("googletrans", "youtube_transcript_api", "requests", "numpy", "scipy") if m in sys.modules]
+print(json.dumps({"import": imported - start, "first_request": done - imported, "heavy_modules": heavy}))
+"""
+
+def _quiet(*args):
+    pass
+
+def make_stages(segments, out_dir):
+    transcript = Transcript.from_segments(segments)
+    text = format_transcript(transcript)
+    urls = [f"https://www.youtube.com/watch?v={i:010d}A&t={i}s" for i in range(len(segments))]
+    url_file = os.path.join(out_dir, "urls.csv")
+    with open(url_file, 'w', encoding='utf-8') as f:
+        # Every other row repeats an earlier video so the seen-set does real work
+        f.writelines(f"{i},{urls[i // 2 if i % 2 else i]},note {i}\n" for i in range(len(urls)))
+    api = FakeTranscriptApi(segments)
+    engine = TranslationEngine(FakeTranslator(latency=0.0), workers=8)
+    summary = summarize_basic(text)
+    return {
+        "extract_video_id": lambda: [extract_video_id(u) for u in urls],
+        "ingest": lambda: ingest([url_file], io.StringIO()),
+        "get_transcript": lambda: get_transcript("benchmark00", api=api),
+        "translate_transcript": lambda: translate_transcript(transcript, 'es', _quiet, engine),
+        "format_transcript": lambda: format_transcript(transcript),
+        "summarize_basic": lambda: summarize_basic(text),
+        "save_transcript": lambda: save_transcript("benchmark", "benchmark00", 'en', False, summary, text, out_dir,
+                                                  transcript),
+    }
+
+def measure(fn, repeat):
+    best = math.inf
+    gc.collect()
+    gc.disable()
+    try:
+        for _ in range(repeat):
+            start = time.perf_counter()
+            fn()
+            best = min(best, time.perf_counter() - start)
+    finally:
+        gc.enable()
+    tracemalloc.start()
+    fn()
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return best, peak
+
+def run(sizes, repeat=5, stages=None):
+    results = {}
+    out_dir = tempfile.mkdtemp(prefix="bench_")
+    try:
+        for size in sizes:
+            segments = synthetic_segments(size)
+            for name, fn in make_stages(segments, out_dir).items():
+                if stages and name not in stages:
+                    continue
+                seconds, peak = measure(fn, repeat if size < 50000 else 2)
+                results.setdefault(name, {})[str(size)] = {"seconds": seconds, "peak_bytes": peak}
+                print(f"{name:<22}{size:>9} segments {seconds * 1000:>11.2f} ms {peak / 1e6:>9.2f} MB", flush=True)
+    finally:
+        shutil.rmtree(out_dir, ignore_errors=True)
+    return results
+
+def cold_start(repeat=5):
+    root = os.path.dirname(os.path.abspath(__file__))
+    out_dir = tempfile.mkdtemp(prefix="bench_")
+    env = dict(os.environ, TRANSCRIPTS_DB=os.path.join(out_dir, "transcripts.db"))
+    runs = []
+    try:
+        for _ in range(repeat):
+            output = subprocess.run([sys.executable, "-c", COLD_START_SCRIPT], cwd=root, env=env, check=True,
+                                    capture_output=True, text=True).stdout
+            runs.append(json.loads(output.strip().splitlines()[-1]))
+    finally:
+        shutil.rmtree(out_dir, ignore_errors=True)
+    return {
+        "import": min(r["import"] for r in runs),
+        "first_request": min(r["first_request"] for r in runs),
+        "heavy_modules": runs[-1]["heavy_modules"],
+    }
+
+def check_cold_start(result, import_budget, request_budget):
+    failures = []
+    if result["import"] > import_budget:
+        failures.append(f"import app: {result['import'] * 1000:.1f} ms (budget {import_budget * 1000:.0f} ms)")
+    if result["first_request"] > request_budget:
+        failures.append(f"first request: {result['first_request'] * 1000:.1f} ms "
+                        f"(budget {request_budget * 1000:.0f} ms)")
+    if result["heavy_modules"]:
+        failures.append(f"imported eagerly: {', '.join(result['heavy_modules'])}")
+    return failures
+
+def scaling(results):
+    # Log-log slope between the smallest and largest size: ~1.0 is linear, ~2.0 quadratic
+    curves = {}
+    for name, by_size in results.items():
+        sizes = sorted(by_size, key=int)
+        lo, hi = by_size[sizes[0]]["seconds"], by_size[sizes[-1]]["seconds"]
+        if len(sizes) > 1 and lo > 0 and hi > 0:
+            curves[name] = round(math.log(hi / lo) / math.log(int(sizes[-1]) / int(sizes[0])), 2)
+    return curves
+
+def compare(results, baseline, tolerance, min_seconds, min_bytes):
+    regressions = []
+    for name, by_size in results.items():
+        for size, current in by_size.items():
+            previous = baseline.get(name, {}).get(size)
+            if not previous:
+                continue
+            seconds_limit = max(previous["seconds"] * (1 + tolerance), previous["seconds"] + min_seconds)
+            bytes_limit = max(previous["peak_bytes"] * (1 + tolerance), previous["peak_bytes"] + min_bytes)
+            if current["seconds"] > seconds_limit:
+                regressions.append(f"{name} @ {size}: {current['seconds'] * 1000:.2f} ms "
+                                   f"(baseline {previous['seconds'] * 1000:.2f} ms)")
+            if current["peak_bytes"] > bytes_limit:
+                regressions.append(f"{name} @ {size}: {current['peak_bytes'] / 1e6:.2f} MB "
+                                   f"(baseline {previous['peak_bytes'] / 1e6:.2f} MB)")
+    return regressions
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Offline micro-benchmarks for every pipeline stage.")
+    parser.add_argument("--sizes", default=",".join(map(str, DEFAULT_SIZES)), help="Comma-separated segment counts")
+    parser.add_argument("--stages", default=None, help="Comma-separated stage names (default: all)")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--baseline", default=DEFAULT_BASELINE)
+    parser.add_argument("--update-baseline", action="store_true")
+    parser.add_argument("--tolerance", type=float, default=0.75, help="Allowed relative slowdown before failing")
+    parser.add_argument("--min-seconds", type=float, default=0.005, help="Ignore slowdowns smaller than this")
+    parser.add_argument("--min-bytes", type=int, default=1 << 20, help="Ignore memory growth smaller than this")
+    parser.add_argument("--json", default=None, help="Also write results to this file")
+    parser.add_argument("--cold-start", action="store_true", help="Only check app import and first-request time")
+    parser.add_argument("--import-budget", type=float, default=float(os.environ.get("COLD_START_IMPORT_BUDGET", 0.3)))
+    parser.add_argument("--request-budget", type=float, default=float(os.environ.get("COLD_START_REQUEST_BUDGET", 0.2)))
+    args = parser.parse_args(argv)
+
+    if args.cold_start:
+        result = cold_start(args.repeat)
+        print(f"import app     {result['import'] * 1000:>9.1f} ms\nfirst request  {result['first_request'] * 1000:>9.1f} ms")
+        failures = check_cold_start(result, args.import_budget, args.request_budget)
+        if failures:
+            print("\nCold start over budget:")
+            for line in failures:
+                print(f"  {line}")
+            return 1
+        print("\nCold start within budget.")
+        return 0
+
+    sizes = [int(s) for s in args.sizes.split(",")]
+    stages = args.stages.split(",") if args.stages else None
+    results = run(sizes, args.repeat, stages)
+    curves = scaling(results)
+    print("\nScaling exponents (1.0 = linear):")
+    for name, slope in curves.items():
+        print(f"  {name:<22}{slope}")
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump({"results": results, "scaling": curves}, f, indent=2)
+
+    if args.update_baseline:
+        baseline = {}
+        if os.path.exists(args.baseline):
+            with open(args.baseline, encoding='utf-8') as f:
+                baseline = json.load(f)
+        for name, by_size in results.items():
+            baseline.setdefault(name, {}).update(by_size)
+        with open(args.baseline, 'w', encoding='utf-8') as f:
+            json.dump(baseline, f, indent=2, sort_keys=True)
+        print(f"\nBaseline saved to: {args.baseline}")
+        return 0
+    if not os.path.exists(args.baseline):
+        print(f"\nNo baseline at {args.baseline}; run with --update-baseline to create one.")
+        return 0
+    with open(args.baseline, encoding='utf-8') as f:
+        baseline = json.load(f)
+    regressions = compare(results, baseline, args.tolerance, args.min_seconds, args.min_bytes)
+    if regressions:
+        print("\nRegressions past baseline:")
+        for line in regressions:
+            print(f"  {line}")
+        return 1
+    print("\nNo regressions against baseline.")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,88 @@
+import threading
+import time
+from collections import OrderedDict
+
+from store import get_store
+
+def _key(video_id, lang):
+    return f"{video_id}:{lang}"
+
+class LRUCache:
+    def __init__(self, max_entries=256, ttl=3600):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                return None
+            expires, value = entry
+            if expires is not None and expires < time.monotonic():
+                del self._data[key]
+                return None
+            self._data.move_to_end(key)
+            return value
+
+    def put(self, key, value):
+        expires = time.monotonic() + self.ttl if self.ttl else None
+        with self._lock:
+            self._data[key] = (expires, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_entries:
+                self._data.popitem(last=False)
+
+    def __len__(self):
+        return len(self._data)
+
+class ResultCache:
+    def __init__(self, dir_path=None, max_entries=256, ttl=3600, lang='en'):
+        self.lang = lang
+        self.memory = LRUCache(max_entries, ttl)
+        self.dir_path = dir_path
+        self._store = None
+        self.hits = {"memory": 0, "disk": 0}
+        self.misses = 0
+        self._lock = threading.Lock()
+
+    @property
+    def store(self):
+        # Opened on first lookup so that constructing the cache at import time touches no files
+        if self._store is None:
+            self._store = get_store(self.dir_path)
+        return self._store
+
+    def get(self, video_id):
+        key = _key(video_id, self.lang)
+        result = self.memory.get(key)
+        tier = "memory"
+        if result is None:
+            result = self.store.get(video_id, self.lang)
+            tier = "disk"
+            if result is not None:
+                self.memory.put(key, result)
+        with self._lock:
+            if result is None:
+                self.misses += 1
+            else:
+                self.hits[tier] += 1
+        return result
+
+    def put(self, result):
+        # The store row is written by save_transcript; only the memory tier needs filling here
+        self.memory.put(_key(result["video_id"], self.lang), result)
+
+    def stats(self):
+        with self._lock:
+            hits = dict(self.hits)
+            misses = self.misses
+        total = sum(hits.values()) + misses
+        return {
+            "hits": hits,
+            "misses": misses,
+            "hit_ratio": round(sum(hits.values()) / total, 4) if total else 0.0,
+            "memory_entries": len(self.memory),
+            "disk_entries": self.store.count(),
+        }
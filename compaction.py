@@ -0,0 +1,513 @@
+import argparse
+import gzip
+import hashlib
+import os
+import re
+import sqlite3
+import sys
+import threading
+import time
+from contextlib import closing
+from urllib.parse import quote
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+from downloads import SUFFIXES
+from store import DB_NAME, SEPARATOR, get_store, store_path
+
+ARCHIVE_DIR = "archive"
+INDEX_NAME = "index.db"
+# Outputs nobody has read or rewritten for this long move into the archive
+ARCHIVE_AFTER = float(os.environ.get("ARCHIVE_AFTER_DAYS", 30)) * 86400
+# Bytes for saved outputs, their compressed copies and the archive; 0 means no budget. The store database
+# is not counted: it holds every transcript's text and is never evicted from.
+DISK_BUDGET = int(os.environ.get("TRANSCRIPTS_DISK_BUDGET", 0))
+PACK_BYTES = int(os.environ.get("ARCHIVE_PACK_BYTES", 64 << 20))
+# A pack is rewritten once this share of it belongs to evicted or replaced members
+REPACK_RATIO = 0.5
+# compressed_variant's temp files younger than this may still be being written
+PART_GRACE = 3600
+# Reads refresh a member's last_access at most this often, so hot members do not write on every hit
+TOUCH_INTERVAL = 3600
+LEGACY_RE = re.compile(r"(transcript|summary)_([0-9A-Za-z_-]{11})\.txt")
+OUTPUT_RE = re.compile(r"[0-9A-Za-z_-]{11}_([A-Za-z]{2,3}(?:-[A-Za-z0-9]+)*)\.txt")
+VIDEO_ID_LINE_RE = re.compile(rb"^Video ID: ([0-9A-Za-z_-]{11})\r?$", re.M)
+SUMMARY_MARK = ("\n\n" + SEPARATOR + "\nSUMMARY\n" + SEPARATOR + "\n\n").encode('ascii')
+TRANSCRIPT_MARK = ("\n\n" + SEPARATOR + "\nFULL TRANSCRIPT\n" + SEPARATOR + "\n\n").encode('ascii')
+
+INDEX_SCHEMA = """
+CREATE TABLE IF NOT EXISTS members (
+    name TEXT PRIMARY KEY,
+    pack TEXT NOT NULL,
+    offset INTEGER NOT NULL,
+    length INTEGER NOT NULL,
+    size INTEGER NOT NULL,
+    sha1 TEXT NOT NULL,
+    mtime_ns INTEGER NOT NULL,
+    last_access REAL NOT NULL
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS members_access ON members (last_access);
+CREATE INDEX IF NOT EXISTS members_pack ON members (pack);
+"""
+
+class Archive:
+    # Cold outputs of one transcripts directory, each stored as its own gzip member appended to a pack file
+    # under archive/. The index maps a file name to (pack, offset, length), so one member is read with a
+    # single seek; a member is also a complete .gz file and is served to gzip clients as is. Packs are
+    # append-only and only ever rewritten whole, by the compactor holding the lock.
+    def __init__(self, dir_path):
+        self.dir = os.path.join(dir_path, ARCHIVE_DIR)
+        self.index_path = os.path.join(self.dir, INDEX_NAME)
+        self._local = threading.local()
+
+    def _connect(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            os.makedirs(self.dir, exist_ok=True)
+            conn = sqlite3.connect(self.index_path, timeout=30)
+            conn.row_factory = sqlite3.Row
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.executescript(INDEX_SCHEMA)
+            self._local.conn = conn
+        return conn
+
+    def exists(self):
+        return os.path.exists(self.index_path)
+
+    def get(self, name):
+        if not self.exists():
+            return None
+        row = self._connect().execute("SELECT * FROM members WHERE name = ?", (name,)).fetchone()
+        return dict(row) if row else None
+
+    def members(self):
+        if not self.exists():
+            return []
+        return [dict(row) for row in self._connect().execute("SELECT * FROM members ORDER BY last_access, name")]
+
+    def read_raw(self, name):
+        # (member, gzip bytes) or (None, None). A repack can move the member between the index lookup
+        # and the open, in which case the fresh index row points at its new home.
+        for _ in range(3):
+            member = self.get(name)
+            if member is None:
+                return None, None
+            try:
+                with open(os.path.join(self.dir, member["pack"]), 'rb') as f:
+                    f.seek(member["offset"])
+                    data = f.read(member["length"])
+            except FileNotFoundError:
+                continue
+            if len(data) == member["length"]:
+                self.touch(member)
+                return member, data
+        return None, None
+
+    def touch(self, member):
+        now = time.time()
+        if now - member["last_access"] >= TOUCH_INTERVAL:
+            with self._connect() as conn:
+                conn.execute("UPDATE members SET last_access = ? WHERE name = ?", (now, member["name"]))
+
+    def _write_pack(self, size):
+        # The newest pack while it has room, else the next one
+        packs = self.packs()
+        if packs and os.path.getsize(os.path.join(self.dir, packs[-1])) + size <= PACK_BYTES:
+            return packs[-1]
+        number = int(packs[-1][5:-3]) + 1 if packs else 1
+        return f"pack-{number:06d}.gz"
+
+    def _append(self, blob, avoid=None):
+        # Appended and synced before the index points at it; a crash in between only leaves dead bytes
+        pack = self._write_pack(len(blob))
+        if pack == avoid:
+            pack = f"pack-{int(pack[5:-3]) + 1:06d}.gz"
+        with open(os.path.join(self.dir, pack), 'ab') as f:
+            offset = f.tell()
+            f.write(blob)
+            f.flush()
+            os.fsync(f.fileno())
+        return pack, offset
+
+    def add(self, name, data, mtime_ns, last_access):
+        # mtime=0 keeps a member byte-identical to gzip-compressing the file, whatever the archive time
+        blob = gzip.compress(data, 9, mtime=0)
+        self._connect()
+        pack, offset = self._append(blob)
+        with self._connect() as conn:
+            conn.execute("INSERT OR REPLACE INTO members (name, pack, offset, length, size, sha1, mtime_ns, "
+                         "last_access) VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                         (name, pack, offset, len(blob), len(data), hashlib.sha1(data).hexdigest(), mtime_ns,
+                          last_access))
+        return len(blob)
+
+    def remove(self, names):
+        if names and self.exists():
+            with self._connect() as conn:
+                conn.executemany("DELETE FROM members WHERE name = ?", [(name,) for name in names])
+
+    def packs(self):
+        if not os.path.isdir(self.dir):
+            return []
+        return sorted(n for n in os.listdir(self.dir) if n.startswith("pack-") and n.endswith(".gz"))
+
+    def disk_usage(self):
+        return sum(os.path.getsize(os.path.join(self.dir, pack)) for pack in self.packs())
+
+    def checkpoint(self):
+        if self.exists():
+            self._connect().execute("PRAGMA wal_checkpoint(TRUNCATE)")
+
+    def repack(self, ratio=REPACK_RATIO):
+        # Copies the live members of packs that are mostly dead into the current pack and drops the old
+        # file. Returns the bytes freed.
+        if not self.exists():
+            return 0
+        live = dict(self._connect().execute("SELECT pack, SUM(length) FROM members GROUP BY pack").fetchall())
+        freed = 0
+        for pack in self.packs():
+            path = os.path.join(self.dir, pack)
+            size = os.path.getsize(path)
+            dead = size - live.get(pack, 0)
+            if size == 0 or dead == 0 or dead < size * ratio:
+                continue
+            rows = self._connect().execute("SELECT name, offset, length FROM members WHERE pack = ? ORDER BY offset",
+                                           (pack,)).fetchall()
+            with open(path, 'rb') as src:
+                for row in rows:
+                    src.seek(row["offset"])
+                    new_pack, new_offset = self._append(src.read(row["length"]), avoid=pack)
+                    with self._connect() as conn:
+                        conn.execute("UPDATE members SET pack = ?, offset = ? WHERE name = ?",
+                                     (new_pack, new_offset, row["name"]))
+            os.unlink(path)
+            freed += dead
+        return freed
+
+_archives = {}
+_archive_lock = threading.Lock()
+
+def get_archive(dir_path=None):
+    if dir_path is None:
+        dir_path = os.path.join(os.getcwd(), "transcripts")
+    key = os.path.abspath(dir_path)
+    if key not in _archives:
+        with _archive_lock:
+            if key not in _archives:
+                _archives[key] = Archive(key)
+    return _archives[key]
+
+def read_only(path):
+    # For dry runs: a connection that creates no files. Without a -wal file everything is in the database
+    # and it is opened immutable; otherwise the existing -wal/-shm pair is read without adding to it.
+    mode = "mode=ro" if os.path.exists(path + "-wal") else "immutable=1"
+    conn = sqlite3.connect(f"file:{quote(path)}?{mode}", uri=True, timeout=30)
+    conn.row_factory = sqlite3.Row
+    return conn
+
+def last_used(st):
+    # atime is only as good as the mount allows (relatime updates it about daily), which is enough for
+    # telling cold files from ones read this month
+    return max(st.st_atime, st.st_mtime)
+
+def read_quietly(path, st):
+    # The compactor's own reads must not make a file look recently used
+    with open(path, 'rb') as f:
+        data = f.read()
+    os.utime(path, ns=(st.st_atime_ns, st.st_mtime_ns))
+    return data
+
+def identify(name, data):
+    # (video_id, lang, kind) for a saved output, a legacy transcript_/summary_ file, or (None, None, None)
+    legacy = LEGACY_RE.fullmatch(name)
+    if legacy:
+        return legacy.group(2), "en", legacy.group(1)
+    match = VIDEO_ID_LINE_RE.search(data, 0, 4096)
+    if match:
+        lang = OUTPUT_RE.fullmatch(name)
+        return match.group(1).decode('ascii'), lang.group(1) if lang else "en", "output"
+    return None, None, None
+
+def sections(data):
+    # The summary and transcript bodies of a full output, split the way store.parse_saved_file splits them
+    _, _, rest = data.partition(SUMMARY_MARK)
+    summary, _, transcript = rest.partition(TRANSCRIPT_MARK)
+    return {"summary": summary, "transcript": transcript}
+
+class Compactor:
+    def __init__(self, dir_path=None, budget=None, archive_after=None, dry_run=False, now=None):
+        self.dir = os.path.abspath(dir_path or os.path.join(os.getcwd(), "transcripts"))
+        self.budget = DISK_BUDGET if budget is None else budget
+        self.archive_after = ARCHIVE_AFTER if archive_after is None else archive_after
+        self.dry_run = dry_run
+        self.now = now or time.time()
+        self.archive = get_archive(self.dir)
+        self.planned = []
+        self.report = {"scanned": 0, "empty": 0, "parts": 0, "sidecars": 0, "duplicates": 0, "archived": 0,
+                       "stale_members": 0, "evicted": 0, "freed": 0, "actions": []}
+
+    def _referenced(self):
+        # Saved outputs the store points at; those win dedupe ties so its filenames stay valid
+        query = "SELECT filename FROM videos WHERE filename IS NOT NULL"
+        if not self.dry_run:
+            rows = get_store(self.dir)._connect().execute(query).fetchall()
+        elif os.path.exists(store_path(self.dir)):
+            with closing(read_only(store_path(self.dir))) as conn:
+                rows = conn.execute(query).fetchall()
+        else:
+            rows = []
+        return {os.path.realpath(row["filename"]) for row in rows}
+
+    def _members(self):
+        if not self.dry_run or not self.archive.exists():
+            return self.archive.members()
+        with closing(read_only(self.archive.index_path)) as conn:
+            return [dict(row) for row in conn.execute("SELECT * FROM members ORDER BY last_access, name")]
+
+    def _repoint(self, old, new):
+        if not self.dry_run:
+            with get_store(self.dir)._connect() as conn:
+                conn.execute("UPDATE videos SET filename = ? WHERE filename IN (?, ?)",
+                             (new, old, os.path.realpath(old)))
+
+    def _delete(self, path, reason, size):
+        self.report[reason] += 1
+        self.report["freed"] += size
+        self.report["actions"].append((reason, os.path.basename(path)))
+        if not self.dry_run:
+            try:
+                os.unlink(path)
+            except FileNotFoundError:
+                pass
+
+    def _scan(self):
+        outputs, sidecars = {}, {}
+        for entry in os.scandir(self.dir):
+            name = entry.name
+            if not entry.is_file(follow_symlinks=False) or name.startswith(".") or name.startswith(DB_NAME):
+                continue
+            st = entry.stat()
+            self.report["scanned"] += 1
+            if name.endswith(".part"):
+                if self.now - st.st_mtime > PART_GRACE:
+                    self._delete(entry.path, "parts", st.st_size)
+            elif name.endswith(tuple(SUFFIXES.values())) and name[:name.rfind(".")].endswith(".txt"):
+                sidecars[entry.path] = st
+            elif name.endswith(".txt"):
+                outputs[entry.path] = st
+        return outputs, sidecars
+
+    def _drop_sidecars(self, path, sidecars, reason="sidecars"):
+        for suffix in SUFFIXES.values():
+            st = sidecars.pop(path + suffix, None)
+            if st is not None:
+                self._delete(path + suffix, reason, st.st_size)
+
+    def _dedupe(self, outputs, sidecars):
+        referenced = self._referenced()
+        files = []
+        for path, st in sorted(outputs.items()):
+            if st.st_size == 0:
+                outputs.pop(path)
+                # A fresh empty file may be an output another worker is still writing
+                if self.now - st.st_mtime <= PART_GRACE:
+                    continue
+                self._delete(path, "empty", 0)
+                self._drop_sidecars(path, sidecars)
+                continue
+            data = read_quietly(path, st)
+            video_id, lang, kind = identify(os.path.basename(path), data)
+            files.append({"path": path, "st": st, "video_id": video_id, "lang": lang, "kind": kind,
+                          "sha1": hashlib.sha1(data).hexdigest(), "referenced": os.path.realpath(path) in referenced,
+                          "data": data if kind in ("transcript", "summary") else None})
+        rank = lambda f: (f["referenced"], f["kind"] is not None, f["st"].st_mtime, f["path"])
+        removed = set()
+
+        def drop(f, keeper=None):
+            removed.add(f["path"])
+            self._delete(f["path"], "duplicates", f["st"].st_size)
+            self._drop_sidecars(f["path"], sidecars)
+            if keeper is not None and f["referenced"]:
+                self._repoint(f["path"], keeper["path"])
+            outputs.pop(f["path"], None)
+
+        # One full output per video and language
+        by_video = {}
+        for f in files:
+            if f["kind"] == "output":
+                by_video.setdefault((f["video_id"], f["lang"]), []).append(f)
+        for group in by_video.values():
+            group.sort(key=rank, reverse=True)
+            for f in group[1:]:
+                drop(f, group[0])
+        # An old transcript_/summary_ file is redundant only when the English output holds the same text;
+        # one that differs (an earlier run, another formatting) is kept and ages into the archive
+        parsed = {}
+        for f in files:
+            keeper = by_video.get((f["video_id"], "en"))
+            if f["kind"] not in ("transcript", "summary") or keeper is None or f["referenced"]:
+                continue
+            if f["video_id"] not in parsed:
+                parsed[f["video_id"]] = sections(read_quietly(keeper[0]["path"], keeper[0]["st"]))
+            if parsed[f["video_id"]][f["kind"]] == f["data"]:
+                drop(f)
+        # Then byte-identical copies under any name
+        by_hash = {}
+        for f in files:
+            if f["path"] not in removed:
+                by_hash.setdefault(f["sha1"], []).append(f)
+        for group in by_hash.values():
+            group.sort(key=rank, reverse=True)
+            for f in group[1:]:
+                drop(f, group[0])
+
+    def _archive_file(self, path, st, sidecars):
+        name = os.path.basename(path)
+        self.report["archived"] += 1
+        self.report["actions"].append(("archived", name))
+        data = read_quietly(path, st)
+        if self.dry_run:
+            length = len(gzip.compress(data, 9, mtime=0))
+            self.planned.append({"name": name, "length": length, "last_access": last_used(st)})
+        else:
+            length = self.archive.add(name, data, st.st_mtime_ns, last_used(st))
+            os.unlink(path)
+        self.report["freed"] += st.st_size - length
+        self._drop_sidecars(path, sidecars)
+        return st.st_size - length
+
+    def usage(self):
+        total = sum(e.stat().st_size for e in os.scandir(self.dir) if e.is_file(follow_symlinks=False)
+                    and not e.name.startswith(".") and not e.name.startswith(DB_NAME))
+        return total + self.archive.disk_usage()
+
+    def run(self):
+        start = time.perf_counter()
+        outputs, sidecars = self._scan()
+        # Precompressed copies whose source was removed or rewritten are never served again
+        for path, st in list(sidecars.items()):
+            source = path[:path.rfind(".")]
+            source_st = outputs.get(source)
+            if source_st is None or source_st.st_mtime_ns != st.st_mtime_ns:
+                sidecars.pop(path)
+                self._delete(path, "sidecars", st.st_size)
+        self._dedupe(outputs, sidecars)
+        # A live file is newer than any archived copy of the same name (the video was processed again)
+        stale = [m["name"] for m in self._members() if os.path.join(self.dir, m["name"]) in outputs]
+        self.report["stale_members"] = len(stale)
+        if not self.dry_run:
+            self.archive.remove(stale)
+
+        for path, st in sorted(outputs.items(), key=lambda item: last_used(item[1])):
+            if self.now - last_used(st) > self.archive_after:
+                self._archive_file(path, st, sidecars)
+                outputs.pop(path)
+
+        if self.budget:
+            # Least recently used first: sidecars (rebuilt on demand), then live files into the archive,
+            # then archived members themselves. The store still holds evicted transcripts' text.
+            over = (self.usage() if not self.dry_run else self.usage() - self.report["freed"]) - self.budget
+            for path, st in sorted(sidecars.items(), key=lambda item: item[1].st_atime):
+                if over <= 0:
+                    break
+                sidecars.pop(path)
+                self._delete(path, "sidecars", st.st_size)
+                over -= st.st_size
+            for path, st in sorted(outputs.items(), key=lambda item: last_used(item[1])):
+                if over <= 0:
+                    break
+                over -= self._archive_file(path, st, sidecars)
+                outputs.pop(path)
+            evicted = []
+            # A dry run plans against the members it would have archived above as well
+            members = sorted([m for m in self._members() if m["name"] not in stale] + self.planned,
+                             key=lambda m: (m["last_access"], m["name"]))
+            for member in members:
+                if over <= 0:
+                    break
+                evicted.append(member["name"])
+                self.report["actions"].append(("evicted", member["name"]))
+                self.report["freed"] += member["length"]
+                over -= member["length"]
+            self.report["evicted"] = len(evicted)
+            if evicted and not self.dry_run:
+                self.archive.remove(evicted)
+        if not self.dry_run:
+            # Over budget every dead byte counts, otherwise only mostly-dead packs are worth rewriting
+            self.archive.repack(0 if self.budget and self.usage() > self.budget else REPACK_RATIO)
+            self.archive.checkpoint()
+        self.report["bytes"] = self.usage()
+        self.report["seconds"] = round(time.perf_counter() - start, 3)
+        return self.report
+
+def compact(dir_path=None, budget=None, archive_after=None, dry_run=False):
+    # One compactor per directory at a time, across processes; a concurrent run is skipped, not queued
+    compactor = Compactor(dir_path, budget, archive_after, dry_run)
+    # A dry run writes nothing, not even the lock
+    if fcntl is None or dry_run:
+        return compactor.run()
+    os.makedirs(compactor.archive.dir, exist_ok=True)
+    fd = os.open(os.path.join(compactor.archive.dir, ".lock"), os.O_RDWR | os.O_CREAT, 0o644)
+    try:
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            return None
+        return compactor.run()
+    finally:
+        os.close(fd)
+
+_compactor_started = False
+
+def start_background(dir_path=None, interval=None, logger=None):
+    # Daemon thread running compact() every COMPACT_INTERVAL seconds (0 disables it). Every gunicorn
+    # worker may start one; the lock lets only one of them work at a time.
+    global _compactor_started
+    interval = float(os.environ.get("COMPACT_INTERVAL", 0)) if interval is None else interval
+    if interval <= 0 or _compactor_started:
+        return False
+    _compactor_started = True
+
+    def loop():
+        while True:
+            time.sleep(interval)
+            try:
+                report = compact(dir_path)
+                if report and logger:
+                    logger.info(f"Compaction freed {report['freed']} bytes, {report['bytes']} in use")
+            except Exception as e:
+                if logger:
+                    logger.warning(f"Compaction failed: {type(e).__name__}: {e}")
+
+    threading.Thread(target=loop, name="compaction", daemon=True).start()
+    return True
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Dedupe, archive and trim the transcripts directory.")
+    parser.add_argument("--dir", default=None, help="Transcripts directory (default: ./transcripts)")
+    parser.add_argument("--budget", type=int, default=None,
+                        help="Disk budget in bytes (default: TRANSCRIPTS_DISK_BUDGET)")
+    parser.add_argument("--archive-after", type=float, default=None, help="Archive outputs unused for this many days")
+    parser.add_argument("-n", "--dry-run", action="store_true", help="Only print what would be done")
+    parser.add_argument("-v", "--verbose", action="store_true", help="Print every file acted on")
+    args = parser.parse_args(argv)
+    archive_after = args.archive_after * 86400 if args.archive_after is not None else None
+    report = compact(args.dir, args.budget, archive_after, args.dry_run)
+    if report is None:
+        print("Another compaction is running")
+        return 1
+    if args.verbose or args.dry_run:
+        for action, name in report["actions"]:
+            print(f"{action:11} {name}")
+    print(f"{report['scanned']} files: {report['duplicates']} duplicates, {report['empty']} empty, "
+          f"{report['parts']} partial and {report['sidecars']} compressed copies removed, {report['archived']} "
+          f"archived, {report['evicted']} evicted; {report['freed']} bytes freed, {report['bytes']} in use "
+          f"({report['seconds']}s)")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,62 @@
+import gzip
+import os
+import shutil
+import tempfile
+
+# Content-Encoding -> suffix of the precompressed copy kept next to a saved file
+SUFFIXES = {"br": ".br", "gzip": ".gz"}
+MIN_COMPRESS_BYTES = int(os.environ.get("MIN_COMPRESS_BYTES", 1024))
+
+_encodings = None
+
+def available_encodings():
+    # In server preference order; brotli is optional and only offered when installed
+    global _encodings
+    if _encodings is None:
+        try:
+            import brotli
+            _encodings = ["br", "gzip"]
+        except ImportError:
+            _encodings = ["gzip"]
+    return _encodings
+
+def _write_gzip(src, dst):
+    # mtime=0 keeps the output (and so its ETag) stable across rebuilds
+    with gzip.GzipFile(fileobj=dst, mode='wb', compresslevel=9, mtime=0) as out:
+        shutil.copyfileobj(src, out, 1 << 20)
+
+def _write_brotli(src, dst):
+    import brotli
+    compressor = brotli.Compressor(mode=brotli.MODE_TEXT, quality=11)
+    for block in iter(lambda: src.read(1 << 20), b""):
+        dst.write(compressor.process(block))
+    dst.write(compressor.finish())
+
+WRITERS = {"br": _write_brotli, "gzip": _write_gzip}
+
+def compressed_variant(path, encoding):
+    # Compressed once per version of the source and then served like any static file. The copy carries the
+    # source's mtime, which is both the staleness check and the Last-Modified every encoding shares.
+    target = path + SUFFIXES[encoding]
+    source_mtime = os.stat(path).st_mtime_ns
+    try:
+        if os.stat(target).st_mtime_ns == source_mtime:
+            return target
+    except FileNotFoundError:
+        pass
+    fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path) or ".", suffix=".part")
+    try:
+        with open(path, 'rb') as src, os.fdopen(fd, 'wb') as dst:
+            WRITERS[encoding](src, dst)
+        os.utime(tmp, ns=(source_mtime, source_mtime))
+        os.replace(tmp, target)
+    except BaseException:
+        os.unlink(tmp)
+        raise
+    return target
+
+def compress_bytes(data, encoding):
+    if encoding == "br":
+        import brotli
+        return brotli.compress(data, mode=brotli.MODE_TEXT, quality=5)
+    return gzip.compress(data, 6, mtime=0)
@@ -0,0 +1,178 @@
+import json
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+class FakeTranslation:
+    def __init__(self, text):
+        self.text = text
+
+class FakeTranslator:
+    def __init__(self, latency=0.2, per_char=0.0):
+        self.latency = latency
+        self.per_char = per_char
+        self.calls = 0
+
+    def translate(self, text, src='auto', dest='en'):
+        self.calls += 1
+        time.sleep(self.latency + self.per_char * len(text))
+        return FakeTranslation("\n".join(f"[{dest}] {line}" for line in text.split("\n")))
+
+WORDS = (
+    "the model learns from experience reward signal world policy value function agent environment "
+    "prediction language people imitation learning goal action state planning search data scale "
+    "compute network training gradient update knowledge understanding question answer problem"
+).split()
+
+def synthetic_segments(count, seed=0, words_per_segment=8):
+    rng = random.Random(seed)
+    segments = []
+    for i in range(count):
+        text = " ".join(rng.choice(WORDS) for _ in range(words_per_segment))
+        if i % 3 == 2:
+            text += "."
+        segments.append({"text": text, "start": i * 2.5, "duration": 2.5})
+    return segments
+
+class FakeLanguage:
+    def __init__(self, language_code):
+        self.language = language_code
+        self.language_code = language_code
+
+class FakeTrack:
+    # Mirrors youtube_transcript_api's Transcript: metadata, fetch() and translate()
+    def __init__(self, api, language_code, is_generated=False, translatable=True, translated=False):
+        self.api = api
+        self.language_code = language_code
+        self.language = language_code
+        self.is_generated = is_generated
+        self.translated = translated
+        self.translation_languages = [FakeLanguage(code) for code in api.translation_languages] if translatable else []
+
+    @property
+    def is_translatable(self):
+        return bool(self.translation_languages)
+
+    def translate(self, language_code):
+        if not any(lang.language_code == language_code for lang in self.translation_languages):
+            raise LookupError(f"Cannot translate {self.language_code} to {language_code}")
+        return FakeTrack(self.api, language_code, True, False, translated=True)
+
+    def fetch(self):
+        self.api.calls += 1
+        time.sleep(self.api.latency)
+        if not self.translated and self.language_code in self.api.languages + self.api.generated:
+            return list(self.api.segments)
+        prefix = f"[{self.language_code}] " if self.translated else ""
+        return [dict(s, text=prefix + s["text"]) for s in self.api.segments]
+
+class FakeTranscriptApi:
+    # `languages` are manually created tracks, `generated` auto-generated ones; every track offers
+    # `translation_languages` unless translatable is False. Each list() and fetch() counts as one call.
+    def __init__(self, segments, latency=0.0, languages=('en',), generated=(), translatable=True,
+                 translation_languages=('en', 'es', 'fr', 'de')):
+        self.segments = segments
+        self.latency = latency
+        self.languages = tuple(languages)
+        self.generated = tuple(generated)
+        self.translatable = translatable
+        self.translation_languages = tuple(translation_languages)
+        self.calls = 0
+
+    def list(self, video_id):
+        self.calls += 1
+        time.sleep(self.latency)
+        return ([FakeTrack(self, code, False, self.translatable) for code in self.languages]
+                + [FakeTrack(self, code, True, self.translatable) for code in self.generated])
+
+    def fetch(self, video_id, languages=None):
+        time.sleep(self.latency)
+        if languages and not set(languages) & set(self.languages):
+            raise LookupError(f"No transcript in {languages}")
+        return list(self.segments)
+
+class FakeUpstream:
+    # Local stand-in for YouTube/translate endpoints: replays scripted (status, body, headers) responses in
+    # order, then answers 200 with `default`. Use as a context manager and point requests at `url`.
+    def __init__(self, script=(), default=None, latency=0.0):
+        self.script = list(script)
+        self.default = default if default is not None else {"title": "Fake video"}
+        self.latency = latency
+        self.requests = []
+        self._lock = threading.Lock()
+        upstream = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                upstream._respond(self)
+
+            do_POST = do_GET
+
+            def log_message(self, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.url = f"http://127.0.0.1:{self.server.server_port}"
+        self.host = f"127.0.0.1:{self.server.server_port}"
+
+    def _respond(self, handler):
+        with self._lock:
+            self.requests.append((time.monotonic(), handler.command, handler.path))
+            status, body, headers = self.script.pop(0) if self.script else (200, self.default, {})
+        time.sleep(self.latency)
+        data = body if isinstance(body, bytes) else json.dumps(body).encode('utf-8')
+        handler.send_response(status)
+        handler.send_header("Content-Length", str(len(data)))
+        for name, value in headers.items():
+            handler.send_header(name, value)
+        handler.end_headers()
+        handler.wfile.write(data)
+
+    def __enter__(self):
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        return self
+
+    def __exit__(self, *exc):
+        self.server.shutdown()
+        self.server.server_close()
+
+class FakeLister:
+    # Stand-in for sync.RssLister over an in-memory catalog {source: [entry, ...]}, newest first. Each
+    # source carries a version so unchanged sources answer "not modified" like a conditional GET.
+    def __init__(self, catalog=None, latency=0.0, page_limit=None):
+        self.catalog = {source: list(entries) for source, entries in (catalog or {}).items()}
+        # Like the Atom feed, list() returns at most page_limit entries; page() is the full, paged listing
+        self.page_limit = page_limit
+        self.versions = {source: 1 for source in self.catalog}
+        self.latency = latency
+        self.calls = 0
+        self._lock = threading.Lock()
+
+    def publish(self, source, video_id, title=None, updated=None):
+        with self._lock:
+            entries = self.catalog.setdefault(source, [])
+            entries[:] = [e for e in entries if e["video_id"] != video_id]
+            entries.insert(0, {"video_id": video_id, "title": title or f"Video {video_id}",
+                               "updated": updated or str(time.time())})
+            self.versions[source] = self.versions.get(source, 0) + 1
+
+    def list(self, source, state=None):
+        with self._lock:
+            self.calls += 1
+        time.sleep(self.latency)
+        if source not in self.catalog:
+            raise LookupError(f"Unknown source {source}")
+        version = self.versions[source]
+        if (state or {}).get("version") == version:
+            return None, state
+        return [dict(e) for e in self.catalog[source][:self.page_limit]], {"version": version}
+
+    def page(self, source, known, state=None):
+        with self._lock:
+            self.calls += 1
+            entries = [dict(e) for e in self.catalog[source]]
+        for i, entry in enumerate(entries):
+            if known([entry["video_id"]]):
+                return entries[:i + 1]
+        return entries
@@ -0,0 +1,21 @@
+import os
+
+bind = f"0.0.0.0:{os.environ.get('PORT', 8080)}"
+# Job state (/jobs/<id>) lives in the worker that accepted the job, so more than one worker is only safe
+# without background jobs until that state is shared
+workers = int(os.environ.get("WEB_CONCURRENCY", 1))
+threads = int(os.environ.get("GUNICORN_THREADS", 4))
+timeout = int(os.environ.get("GUNICORN_TIMEOUT", 120))
+# Import the app once in the master and fork workers from it instead of importing it in every worker
+preload_app = os.environ.get("GUNICORN_PRELOAD", "0") == "1"
+WARM_UP = os.environ.get("GUNICORN_WARM_UP", "1") == "1"
+
+def when_ready(server):
+    if preload_app and WARM_UP:
+        import app
+        app.warm_up(connect=False)
+
+def post_worker_init(worker):
+    if WARM_UP:
+        import app
+        app.warm_up(connect=True)
@@ -0,0 +1,135 @@
+import os
+import re
+import threading
+from bisect import bisect_left
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+CHUNK_SECONDS = float(os.environ.get("SUMMARY_CHUNK_SECONDS", 600))
+FANOUT = int(os.environ.get("SUMMARY_FANOUT", 8))
+SENTENCE_END_RE = re.compile(r'[.!?]+\s')
+
+class ExtractiveBackend:
+    # Local tf-idf/TextRank sentence extraction. Plain picklable object so chunks can be scored in worker
+    # processes; each worker only ever holds one chunk's matrix.
+    parallel = "process"
+    # Scoring has ~1 ms fixed cost per call, so chunks stay large enough for it to vanish
+    chunk_chars = 100000
+    note = "(Note: Basic summary, no AI.)"
+
+    def __init__(self, method=None):
+        self.method = method or os.environ.get("SUMMARY_METHOD", "tfidf")
+
+    def __call__(self, text, num_sentences):
+        from summarizer import extract_key_sentences
+        return extract_key_sentences(text, num_sentences, self.method)
+
+class OpenAIBackend:
+    # Network-bound, so chunks fan out over threads rather than processes
+    parallel = "thread"
+    # ~5k tokens per request
+    chunk_chars = 20000
+
+    def __init__(self, model=None, api_key=None, max_tokens=600):
+        self.model = model or os.environ.get("OPENAI_MODEL", "gpt-4o-mini")
+        self.api_key = api_key or os.environ.get("OPENAI_API_KEY")
+        self.max_tokens = max_tokens
+        self.note = f"(Note: AI summary by {self.model}.)"
+        self._local = threading.local()
+
+    def _client(self):
+        client = getattr(self._local, "client", None)
+        if client is None:
+            import openai
+            client = self._local.client = openai.OpenAI(api_key=self.api_key)
+        return client
+
+    def __call__(self, text, num_sentences):
+        response = self._client().chat.completions.create(
+            model=self.model,
+            messages=[
+                {"role": "system", "content": "You summarize video transcripts into short, factual key points."},
+                {"role": "user", "content": f"List the {num_sentences} most important points of this transcript "
+                                            f"excerpt, one per line, no numbering:\n\n{text}"},
+            ],
+            max_tokens=self.max_tokens,
+            temperature=0.2,
+        )
+        lines = (line.strip().lstrip("-*• ").strip() for line in response.choices[0].message.content.splitlines())
+        return [line for line in lines if line][:num_sentences]
+
+BACKENDS = {"extractive": ExtractiveBackend, "openai": OpenAIBackend}
+
+def get_backend(name=None):
+    return BACKENDS[name or os.environ.get("SUMMARY_BACKEND", "extractive")]()
+
+def chunk_text(text, max_chars):
+    # Cut at the last sentence end inside each window, else the last space, else hard at max_chars
+    chunks = []
+    start = 0
+    while len(text) - start > max_chars:
+        end = start + max_chars
+        cut = None
+        for match in SENTENCE_END_RE.finditer(text, start + max_chars // 2, end):
+            cut = match.end()
+        if cut is None:
+            space = text.rfind(" ", start, end)
+            cut = space + 1 if space > start else end
+        chunks.append(text[start:cut])
+        start = cut
+    chunks.append(text[start:])
+    return [c for c in chunks if c.strip()]
+
+def chunk_transcript(transcript, max_chars, seconds=CHUNK_SECONDS):
+    # Time windows first so each partial covers one stretch of the video, then the char cap on long windows
+    from transcript import Transcript
+    transcript = Transcript.from_segments(transcript)
+    starts = transcript.starts[transcript.lo:transcript.hi]
+    chunks = []
+    lo = 0
+    while lo < len(transcript):
+        hi = max(lo + 1, bisect_left(starts, starts[lo] + seconds, lo))
+        chunks.extend(chunk_text(transcript[lo:hi].text(), max_chars))
+        lo = hi
+    return chunks
+
+_pools = {}
+_pool_lock = threading.Lock()
+
+def get_pool(kind):
+    # One long-lived pool per kind; spawned (not forked) workers are safe to start from threaded servers.
+    # A single CPU gains nothing from extra processes, so then chunks are mapped inline.
+    workers = int(os.environ.get("SUMMARY_WORKERS", 0)) or os.cpu_count() or 2
+    if kind == "process" and workers == 1:
+        return None
+    pool = _pools.get(kind)
+    if pool is None:
+        with _pool_lock:
+            pool = _pools.get(kind)
+            if pool is None:
+                if kind == "process":
+                    import multiprocessing
+                    pool = ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn"))
+                else:
+                    pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="summarize")
+                _pools[kind] = pool
+    return pool
+
+def summarize_hierarchical(text, num_sentences=10, backend=None, max_chars=None, fanout=FANOUT):
+    # Map: summarize each chunk in parallel. Reduce: summarize groups of `fanout` partials, level by level,
+    # until one group is left; its summary is the result. Short input skips the pool entirely.
+    backend = backend or get_backend()
+    # Each reduce level has to merge at least two partials or it never converges
+    fanout = max(2, fanout)
+    max_chars = max_chars or int(os.environ.get("SUMMARY_CHUNK_CHARS", 0)) or backend.chunk_chars
+    chunks = chunk_text(text, max_chars) if isinstance(text, str) else chunk_transcript(text, max_chars)
+    if len(chunks) <= 1:
+        return backend(chunks[0], num_sentences) if chunks else []
+    pool = get_pool(backend.parallel)
+    while True:
+        partials = list((pool.map if pool else map)(backend, chunks, [num_sentences] * len(chunks)))
+        # Points are rejoined as sentences so the next level can split them again
+        merged = [".\n".join(p for points in partials[i:i + fanout] for p in points) + "."
+                  for i in range(0, len(partials), fanout)]
+        if len(merged) == 1:
+            return backend(merged[0], num_sentences)
+        chunks = merged
@@ -0,0 +1,42 @@
+import os
+import threading
+from urllib.parse import urlsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from scheduler import get_scheduler, retry_after
+
+class PooledSession(requests.Session):
+    def __init__(self, pool_size=20, timeout=(5, 10), scheduler=None):
+        super().__init__()
+        self.timeout = timeout
+        self.scheduler = scheduler
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+        self.mount("https://", adapter)
+        self.mount("http://", adapter)
+
+    def request(self, method, url, **kwargs):
+        kwargs.setdefault("timeout", self.timeout)
+        send = super().request
+        if self.scheduler is None:
+            return send(method, url, **kwargs)
+        # Every outbound call shares the per-host rate limit, backoff and circuit breaker
+        return self.scheduler.call(urlsplit(url).netloc, lambda: send(method, url, **kwargs), throttled=retry_after,
+                                   retry_on=(requests.ConnectionError, requests.Timeout))
+
+_session = None
+_lock = threading.Lock()
+
+def get_session():
+    global _session
+    if _session is None:
+        with _lock:
+            if _session is None:
+                _session = PooledSession(
+                    pool_size=int(os.environ.get("HTTP_POOL_SIZE", 20)),
+                    timeout=(float(os.environ.get("HTTP_CONNECT_TIMEOUT", 5)),
+                             float(os.environ.get("HTTP_READ_TIMEOUT", 10))),
+                    scheduler=get_scheduler(),
+                )
+    return _session
@@ -0,0 +1,152 @@
+import argparse
+import base64
+import csv
+import gzip
+import io
+import json
+import os
+import sys
+import time
+
+import numpy as np
+
+from Youtube_transcript_translate import VIDEO_ID_ANYCASE_RE, VIDEO_ID_RE, extract_video_id
+
+CHUNK_CHARS = 1 << 22
+# Each ID is decoded with one pad character appended: 12 base64 chars -> 9 bytes, of which the first 8
+# hold all 64 significant bits (the 11th character's low 2 bits are always zero)
+KEY_DTYPE = np.dtype([("key", ">u8"), ("pad", "u1")])
+
+def encode_ids(ids):
+    if not ids:
+        return np.empty(0, dtype=np.uint64)
+    raw = base64.urlsafe_b64decode("A".join(ids) + "A")
+    return np.frombuffer(raw, dtype=KEY_DTYPE)["key"].astype(np.uint64)
+
+class SeenSet:
+    # IDs packed into uint64 and kept as sorted runs that are merged like a binary counter:
+    # 8 bytes per ID and O(log n) runs to probe per batch
+    def __init__(self):
+        self.runs = []
+        self.count = 0
+
+    def __len__(self):
+        return self.count
+
+    def add(self, keys):
+        # Returns a mask over `keys` selecting the first occurrence of each key not seen before
+        uniq, first = np.unique(keys, return_index=True)
+        fresh = np.ones(len(uniq), dtype=bool)
+        for run in self.runs:
+            pos = np.minimum(np.searchsorted(run, uniq), len(run) - 1)
+            fresh &= run[pos] != uniq
+        new = uniq[fresh]
+        if len(new):
+            self.runs.append(new)
+            self.count += len(new)
+            while len(self.runs) > 1 and len(self.runs[-2]) <= len(self.runs[-1]):
+                last = self.runs.pop()
+                self.runs[-1] = np.sort(np.concatenate((self.runs[-1], last)))
+        mask = np.zeros(len(keys), dtype=bool)
+        mask[first[fresh]] = True
+        return mask
+
+def open_input(path):
+    if path == "-":
+        return io.TextIOWrapper(sys.stdin.buffer, encoding='utf-8', errors='replace', newline='')
+    if path.endswith(".gz"):
+        return gzip.open(path, 'rt', encoding='utf-8', errors='replace', newline='')
+    return open(path, encoding='utf-8', errors='replace', newline='')
+
+def iter_chunks(f, size=CHUNK_CHARS):
+    # Whole lines only, each block framed by newlines so the bare-ID alternative can anchor on them
+    while True:
+        chunk = f.read(size)
+        if not chunk:
+            return
+        if not chunk.endswith("\n"):
+            chunk += f.readline()
+        yield "\n" + chunk + ("" if chunk.endswith("\n") else "\n")
+
+def scan_ids(chunk):
+    # The fast case-sensitive matcher unless some host in the block is not written in lower case
+    regex = VIDEO_ID_RE if chunk.count("youtu") == chunk.lower().count("youtu") else VIDEO_ID_ANYCASE_RE
+    return [a or b for a, b in regex.findall(chunk)]
+
+def iter_column_values(f, column, fmt):
+    if fmt == "jsonl":
+        for line in f:
+            try:
+                yield json.loads(line).get(column)
+            except (ValueError, AttributeError):
+                yield None
+        return
+    for row in csv.DictReader(f, delimiter="\t" if fmt == "tsv" else ","):
+        yield row.get(column)
+
+def detect_format(path):
+    name = path[:-3] if path.endswith(".gz") else path
+    ext = os.path.splitext(name)[1].lower()
+    return {".jsonl": "jsonl", ".ndjson": "jsonl", ".tsv": "tsv"}.get(ext, "csv")
+
+def iter_batches(f, column=None, fmt="csv", batch_size=100000):
+    if column is None:
+        for chunk in iter_chunks(f):
+            yield chunk.count("\n") - 1, scan_ids(chunk)
+        return
+    # Slower exact mode: one field per row, so a bare ID inside a CSV cell or JSON value is accepted too
+    rows, batch = 0, []
+    for value in iter_column_values(f, column, fmt):
+        rows += 1
+        video_id = extract_video_id(str(value)) if value else None
+        if video_id:
+            batch.append(video_id)
+        if rows == batch_size:
+            yield rows, batch
+            rows, batch = 0, []
+    yield rows, batch
+
+def ingest(paths, out, column=None, fmt=None, seen=None):
+    seen = seen if seen is not None else SeenSet()
+    stats = {"lines": 0, "ids": 0, "unique": 0, "duplicates": 0}
+    for path in paths:
+        with open_input(path) as f:
+            for lines, ids in iter_batches(f, column, fmt or detect_format(path)):
+                stats["lines"] += lines
+                stats["ids"] += len(ids)
+                if not ids:
+                    continue
+                mask = seen.add(encode_ids(ids))
+                fresh = [ids[i] for i in np.flatnonzero(mask).tolist()]
+                stats["unique"] += len(fresh)
+                stats["duplicates"] += len(ids) - len(fresh)
+                if fresh:
+                    out.write("\n".join(fresh) + "\n")
+    return stats
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Extract, validate and dedupe video IDs from CSV/JSONL/text "
+                                                 "into a work list with one ID per line.")
+    parser.add_argument("inputs", nargs="+", help="Input files (.gz supported), '-' for stdin")
+    parser.add_argument("-o", "--out", default="-", help="Work list path (default: stdout)")
+    parser.add_argument("--column", default=None,
+                        help="Only read this CSV column / JSON key; also accepts bare IDs inside it")
+    parser.add_argument("--format", choices=("csv", "tsv", "jsonl"), default=None,
+                        help="Input format for --column (default: from the file extension)")
+    args = parser.parse_args(argv)
+
+    start = time.perf_counter()
+    out = sys.stdout if args.out == "-" else open(args.out, 'w', encoding='utf-8')
+    try:
+        stats = ingest(args.inputs, out, args.column, args.format)
+    finally:
+        if out is not sys.stdout:
+            out.close()
+    elapsed = time.perf_counter() - start
+    rate = stats["lines"] / elapsed if elapsed else 0
+    print(f"{stats['lines']} lines, {stats['ids']} IDs, {stats['unique']} unique, {stats['duplicates']} duplicates "
+          f"in {elapsed:.2f}s ({rate:,.0f} lines/s)", file=sys.stderr)
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
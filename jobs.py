@@ -0,0 +1,104 @@
+import threading
+import time
+import traceback
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+QUEUED = "queued"
+RUNNING = "running"
+DONE = "done"
+FAILED = "failed"
+
+class Job:
+    def __init__(self):
+        self.id = uuid.uuid4().hex
+        self.status = QUEUED
+        self.stage = None
+        self.done = None
+        self.total = None
+        self.result = None
+        self.error = None
+        self.created = time.time()
+        self.started = None
+        self.finished = None
+
+    def report(self, stage, done=None, total=None):
+        self.stage = stage
+        self.done = done
+        self.total = total
+
+    def to_dict(self):
+        return {
+            "id": self.id,
+            "status": self.status,
+            "stage": self.stage,
+            "progress": {"done": self.done, "total": self.total},
+            "result": self.result,
+            "error": self.error,
+            "created": self.created,
+            "started": self.started,
+            "finished": self.finished,
+        }
+
+class JobQueue:
+    def __init__(self, workers=2, max_jobs=1000):
+        self.max_jobs = max_jobs
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="job")
+        self._jobs = OrderedDict()
+        self._active = {}
+        self._lock = threading.Lock()
+
+    def submit(self, fn, *args, **kwargs):
+        return self.submit_once(None, fn, *args, **kwargs)
+
+    def submit_once(self, key, fn, *args, **kwargs):
+        # With a key, a second submission while the first is queued or running returns the existing job
+        with self._lock:
+            job = self._active.get(key) if key is not None else None
+            if job is not None:
+                return job
+            job = Job()
+            self._jobs[job.id] = job
+            if key is not None:
+                self._active[key] = job
+            self._prune()
+        self._executor.submit(self._run, job, key, fn, args, kwargs)
+        return job
+
+    def get(self, job_id):
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def counts(self):
+        counts = dict.fromkeys((QUEUED, RUNNING, DONE, FAILED), 0)
+        with self._lock:
+            for job in self._jobs.values():
+                counts[job.status] += 1
+        return counts
+
+    def _run(self, job, key, fn, args, kwargs):
+        job.status = RUNNING
+        job.started = time.time()
+        try:
+            job.result = fn(*args, progress=job.report, **kwargs)
+            job.status = DONE
+        except Exception as e:
+            job.error = f"{type(e).__name__}: {e}"
+            job.status = FAILED
+            traceback.print_exc()
+        job.finished = time.time()
+        if key is not None:
+            with self._lock:
+                if self._active.get(key) is job:
+                    del self._active[key]
+
+    def _prune(self):
+        excess = len(self._jobs) - self.max_jobs
+        if excess <= 0:
+            return
+        for job_id in [j.id for j in self._jobs.values() if j.status in (DONE, FAILED)][:excess]:
+            del self._jobs[job_id]
+
+    def shutdown(self, wait=True):
+        self._executor.shutdown(wait=wait)
@@ -0,0 +1,49 @@
+import os
+import threading
+import time
+
+from store import get_store
+
+METADATA_SCHEMA = """
+CREATE TABLE IF NOT EXISTS video_metadata (
+    video_id TEXT PRIMARY KEY,
+    title TEXT,
+    author TEXT,
+    source TEXT NOT NULL,
+    expires_at REAL NOT NULL
+) WITHOUT ROWID;
+"""
+
+class MetadataCache:
+    # Resolved titles (and oEmbed author) per video. A row with no title is a negative entry: the video had
+    # no title anywhere, so it is not looked up again until the shorter negative TTL runs out.
+    def __init__(self, store, ttl=None, negative_ttl=None):
+        self.store = store
+        self.ttl = float(os.environ.get("TITLE_TTL", 30 * 86400)) if ttl is None else ttl
+        self.negative_ttl = float(os.environ.get("TITLE_NEGATIVE_TTL", 3600)) if negative_ttl is None else negative_ttl
+        with store._connect() as conn:
+            conn.executescript(METADATA_SCHEMA)
+
+    def get(self, video_id):
+        # None on a miss or expired entry, else {"title", "author", "source"} with title None for a negative hit
+        row = self.store._connect().execute(
+            "SELECT title, author, source FROM video_metadata WHERE video_id = ? AND expires_at > ?",
+            (video_id, time.time())).fetchone()
+        return dict(row) if row else None
+
+    def put(self, video_id, title, source, author=None):
+        expires_at = time.time() + (self.ttl if title else self.negative_ttl)
+        with self.store._connect() as conn:
+            conn.execute("INSERT OR REPLACE INTO video_metadata (video_id, title, author, source, expires_at) "
+                         "VALUES (?, ?, ?, ?, ?)", (video_id, title, author, source, expires_at))
+
+_caches = {}
+_cache_lock = threading.Lock()
+
+def get_metadata_cache(dir_path=None):
+    store = get_store(dir_path)
+    if store.path not in _caches:
+        with _cache_lock:
+            if store.path not in _caches:
+                _caches[store.path] = MetadataCache(store)
+    return _caches[store.path]
@@ -0,0 +1,165 @@
+import contextvars
+import threading
+import time
+from contextlib import contextmanager
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300)
+
+_registry = []
+
+def _label_str(labelnames, values):
+    if not labelnames:
+        return ""
+    escape = lambda v: str(v).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+    pairs = ",".join(f'{k}="{escape(v)}"' for k, v in zip(labelnames, values))
+    return "{" + pairs + "}"
+
+def _format(value):
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+class _Metric:
+    kind = None
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+        _registry.append(self)
+
+    def _key(self, labels):
+        return tuple(str(labels.get(k, "")) for k in self.labelnames)
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        with self._lock:
+            items = sorted(self._values.items())
+        for key, value in items:
+            lines.append(f"{self.name}{_label_str(self.labelnames, key)} {_format(value)}")
+        return lines
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels):
+        return self._values.get(self._key(labels), 0)
+
+class Gauge(_Metric):
+    kind = "gauge"
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def dec(self, amount=1, **labels):
+        self.inc(-amount, **labels)
+
+    def set(self, value, **labels):
+        with self._lock:
+            self._values[self._key(labels)] = value
+
+    def value(self, **labels):
+        return self._values.get(self._key(labels), 0)
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets)) + (float("inf"),)
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                state = self._values[key] = [[0] * len(self.buckets), 0.0, 0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    state[0][i] += 1
+                    break
+            state[1] += value
+            state[2] += 1
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        names = self.labelnames + ("le",)
+        with self._lock:
+            items = sorted((key, ([*state[0]], state[1], state[2])) for key, state in self._values.items())
+        for key, (counts, total, count) in items:
+            cumulative = 0
+            for bound, n in zip(self.buckets, counts):
+                cumulative += n
+                lines.append(f"{self.name}_bucket{_label_str(names, key + (_format(bound),))} {cumulative}")
+            lines.append(f"{self.name}_sum{_label_str(self.labelnames, key)} {total!r}")
+            lines.append(f"{self.name}_count{_label_str(self.labelnames, key)} {count}")
+        return lines
+
+def render():
+    lines = []
+    for metric in _registry:
+        lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
+
+STAGE_SECONDS = Histogram("pipeline_stage_seconds", "Time spent in each pipeline stage", ["stage"])
+STAGE_FAILURES = Counter("pipeline_stage_failures_total", "Pipeline stages that raised", ["stage"])
+STAGE_IN_FLIGHT = Gauge("pipeline_stage_in_flight", "Pipeline stages currently running", ["stage"])
+SOURCES = Counter("pipeline_source_total", "Which source or fallback served a stage", ["stage", "source"])
+HTTP_REQUESTS = Counter("http_requests_total", "HTTP requests served", ["route", "method", "status"])
+HTTP_SECONDS = Histogram("http_request_seconds", "HTTP request latency", ["route"])
+HTTP_IN_FLIGHT = Gauge("http_requests_in_flight", "HTTP requests currently being served")
+JOBS = Gauge("jobs", "Jobs retained by the job queue", ["status"])
+CACHE_LOOKUPS = Gauge("result_cache_lookups", "Result cache lookups since start", ["result"])
+PIPELINES_IN_FLIGHT = Gauge("pipelines_in_flight", "Distinct videos with a pipeline run in progress")
+PIPELINE_WAITERS = Gauge("pipeline_waiters", "Requests attached to another request's pipeline run")
+CACHE_ENTRIES = Gauge("result_cache_entries", "Entries held by each result cache tier", ["tier"])
+
+# Per-request stage timings, collected for structured logs
+_timings = contextvars.ContextVar("timings", default=None)
+
+def begin_timings():
+    timings = {}
+    return timings, _timings.set(timings)
+
+def end_timings(token):
+    _timings.reset(token)
+
+@contextmanager
+def collect_timings():
+    timings, token = begin_timings()
+    try:
+        yield timings
+    finally:
+        end_timings(token)
+
+@contextmanager
+def timed(stage):
+    STAGE_IN_FLIGHT.inc(stage=stage)
+    start = time.perf_counter()
+    try:
+        yield
+    except Exception:
+        STAGE_FAILURES.inc(stage=stage)
+        raise
+    finally:
+        elapsed = time.perf_counter() - start
+        STAGE_IN_FLIGHT.dec(stage=stage)
+        STAGE_SECONDS.observe(elapsed, stage=stage)
+        timings = _timings.get()
+        if timings is not None:
+            timings[stage] = round(timings.get(stage, 0) + elapsed, 4)
+
+def record_source(stage, source):
+    SOURCES.inc(stage=stage, source=source)
+    timings = _timings.get()
+    if timings is not None:
+        timings[f"{stage}_source"] = source
@@ -0,0 +1,242 @@
+import asyncio
+import os
+import random
+import threading
+import time
+
+from metrics import Counter, Gauge
+
+RETRY_STATUSES = frozenset((429, 500, 502, 503, 504))
+DEFAULT_HOST_RATES = "www.youtube.com=5,translate.googleapis.com=5"
+
+UPSTREAM_RETRIES = Counter("upstream_retries_total", "Outbound calls retried after throttling or errors",
+                           ["host", "reason"])
+UPSTREAM_REJECTED = Counter("upstream_rejected_total", "Outbound calls failed fast by an open circuit", ["host"])
+CIRCUIT_OPEN = Gauge("upstream_circuit_open", "1 while the circuit breaker for a host is open", ["host"])
+
+class CircuitOpenError(Exception):
+    def __init__(self, host, retry_in):
+        super().__init__(f"Circuit open for {host}; retry in {retry_in:.1f}s")
+        self.host = host
+        self.retry_in = retry_in
+
+class TokenBucket:
+    def __init__(self, rate=None, burst=None):
+        self.rate = rate
+        self.burst = burst or max(1.0, rate or 1.0)
+        self._tokens = self.burst
+        self._updated = time.monotonic()
+        self._paused_until = 0.0
+        self._lock = threading.Lock()
+
+    def reserve(self):
+        # Take a token (possibly going into debt) and return how long the caller must wait before using it
+        with self._lock:
+            now = time.monotonic()
+            wait = max(0.0, self._paused_until - now)
+            if self.rate:
+                self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                self._tokens -= 1
+                if self._tokens < 0:
+                    wait = max(wait, -self._tokens / self.rate)
+        return wait
+
+    def acquire(self):
+        wait = self.reserve()
+        if wait > 0:
+            time.sleep(wait)
+
+    def pause(self, seconds):
+        # Hold back every caller for this host, e.g. for the duration of a Retry-After
+        with self._lock:
+            self._paused_until = max(self._paused_until, time.monotonic() + seconds)
+
+class CircuitBreaker:
+    def __init__(self, threshold=5, cooldown=30.0):
+        self.threshold = threshold
+        self.cooldown = cooldown
+        self.failures = 0
+        self.opened = None
+        self._probing = False
+        self._lock = threading.Lock()
+
+    @property
+    def state(self):
+        if self.opened is None:
+            return "closed"
+        return "half-open" if time.monotonic() - self.opened >= self.cooldown else "open"
+
+    def allow(self):
+        # Once the cooldown has passed a single probe call is let through; its outcome closes or reopens the circuit
+        with self._lock:
+            if self.opened is None:
+                return True
+            if self._probing or time.monotonic() - self.opened < self.cooldown:
+                return False
+            self._probing = True
+            return True
+
+    def retry_in(self):
+        if self.opened is None:
+            return 0.0
+        return max(0.0, self.opened + self.cooldown - time.monotonic())
+
+    def success(self):
+        with self._lock:
+            self.failures = 0
+            self.opened = None
+            self._probing = False
+
+    def failure(self):
+        with self._lock:
+            self.failures += 1
+            if self._probing or self.failures >= self.threshold:
+                self.opened = time.monotonic()
+            self._probing = False
+
+def parse_rates(spec):
+    rates = {}
+    for item in (spec or "").split(","):
+        host, _, rate = item.partition("=")
+        if host.strip() and rate.strip():
+            rates[host.strip()] = float(rate)
+    return rates
+
+class _Host:
+    def __init__(self, bucket, breaker):
+        self.bucket = bucket
+        self.breaker = breaker
+
+class FetchScheduler:
+    def __init__(self, rate=None, rates=None, burst=None, retries=3, backoff=0.5, max_backoff=30.0,
+                 threshold=5, cooldown=30.0):
+        self.rate = rate
+        self.rates = rates or {}
+        self.burst = burst
+        self.retries = retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.threshold = threshold
+        self.cooldown = cooldown
+        self._hosts = {}
+        self._lock = threading.Lock()
+
+    def host(self, host):
+        state = self._hosts.get(host)
+        if state is None:
+            with self._lock:
+                state = self._hosts.get(host)
+                if state is None:
+                    rate = self.rates.get(host, self.rate)
+                    state = self._hosts[host] = _Host(TokenBucket(rate, self.burst),
+                                                      CircuitBreaker(self.threshold, self.cooldown))
+        return state
+
+    def delay(self, attempt):
+        # Full jitter: spreads retries from concurrent workers instead of retrying in lockstep
+        return random.uniform(0, min(self.max_backoff, self.backoff * 2 ** attempt))
+
+    def call(self, host, fn, throttled=None, retry_on=(Exception,), retries=None):
+        # `throttled(result)` returns None for a usable result, or the seconds the host asked us to wait.
+        # A throttled result is returned as-is once retries run out so the caller sees the real response.
+        state = self.host(host)
+        retries = self.retries if retries is None else retries
+        for attempt in range(retries + 1):
+            time.sleep(self._admit(host, state))
+            try:
+                result = fn()
+            except retry_on as e:
+                wait = self._failed(host, state, type(e).__name__, attempt, retries)
+                if wait is None:
+                    raise
+                time.sleep(wait)
+                continue
+            except BaseException:
+                # Not retryable, but it still has to settle the breaker: a probe that never reported back
+                # would keep the host half-open and rejecting every call
+                state.breaker.failure()
+                raise
+            wait = throttled(result) if throttled else None
+            if wait is None:
+                return self._succeeded(host, state, result)
+            wait = self._failed(host, state, str(getattr(result, "status_code", "throttled")), attempt, retries, wait)
+            if wait is None:
+                return result
+            time.sleep(wait)
+
+    async def acall(self, host, fn, throttled=None, retry_on=(Exception,), retries=None):
+        # Same as call() for coroutine functions: waits with asyncio.sleep so the event loop keeps running
+        state = self.host(host)
+        retries = self.retries if retries is None else retries
+        for attempt in range(retries + 1):
+            await asyncio.sleep(self._admit(host, state))
+            try:
+                result = await fn()
+            except retry_on as e:
+                wait = self._failed(host, state, type(e).__name__, attempt, retries)
+                if wait is None:
+                    raise
+                await asyncio.sleep(wait)
+                continue
+            except BaseException:
+                state.breaker.failure()
+                raise
+            wait = throttled(result) if throttled else None
+            if wait is None:
+                return self._succeeded(host, state, result)
+            wait = self._failed(host, state, str(getattr(result, "status_code", "throttled")), attempt, retries, wait)
+            if wait is None:
+                return result
+            await asyncio.sleep(wait)
+
+    def _admit(self, host, state):
+        if not state.breaker.allow():
+            UPSTREAM_REJECTED.inc(host=host)
+            raise CircuitOpenError(host, state.breaker.retry_in())
+        return state.bucket.reserve()
+
+    def _succeeded(self, host, state, result):
+        state.breaker.success()
+        CIRCUIT_OPEN.set(0, host=host)
+        return result
+
+    def _failed(self, host, state, reason, attempt, retries, wait=0.0):
+        # Returns the delay before the next attempt, or None once retries are exhausted
+        state.breaker.failure()
+        if state.breaker.opened is not None:
+            CIRCUIT_OPEN.set(1, host=host)
+        if attempt == retries:
+            return None
+        UPSTREAM_RETRIES.inc(host=host, reason=reason)
+        wait = min(self.max_backoff, max(wait, self.delay(attempt)))
+        state.bucket.pause(wait)
+        return wait
+
+def retry_after(response):
+    if response.status_code not in RETRY_STATUSES:
+        return None
+    try:
+        return max(0.0, float(response.headers.get("Retry-After", 0)))
+    except ValueError:
+        return 0.0
+
+_scheduler = None
+_scheduler_lock = threading.Lock()
+
+def get_scheduler():
+    global _scheduler
+    if _scheduler is None:
+        with _scheduler_lock:
+            if _scheduler is None:
+                _scheduler = FetchScheduler(
+                    rate=float(os.environ.get("FETCH_RATE", 0)) or None,
+                    rates=parse_rates(os.environ.get("FETCH_HOST_RATES", DEFAULT_HOST_RATES)),
+                    burst=float(os.environ.get("FETCH_BURST", 0)) or None,
+                    retries=int(os.environ.get("FETCH_RETRIES", 3)),
+                    backoff=float(os.environ.get("FETCH_BACKOFF", 0.5)),
+                    max_backoff=float(os.environ.get("FETCH_MAX_BACKOFF", 30)),
+                    threshold=int(os.environ.get("BREAKER_THRESHOLD", 5)),
+                    cooldown=float(os.environ.get("BREAKER_COOLDOWN", 30)),
+                )
+    return _scheduler
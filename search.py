@@ -0,0 +1,137 @@
+import argparse
+import json
+import os
+import re
+import sys
+import threading
+
+from store import get_store, iter_saved_files
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS search_docs (
+    id INTEGER PRIMARY KEY,
+    video_id TEXT NOT NULL,
+    lang TEXT NOT NULL,
+    UNIQUE (video_id, lang)
+);
+CREATE VIRTUAL TABLE IF NOT EXISTS search_index USING fts5(
+    video_id UNINDEXED, lang UNINDEXED, title, summary, body,
+    tokenize = 'porter unicode61'
+);
+"""
+
+# Column weights for bm25(): video_id, lang, title, summary, body
+WEIGHTS = (0.0, 0.0, 10.0, 3.0, 1.0)
+TERM_RE = re.compile(r'"([^"]*)"|(\S+)')
+
+def build_query(text):
+    # Quote every keyword and phrase so user input is never parsed as FTS5 syntax;
+    # a trailing * keeps prefix search
+    terms = []
+    for phrase, word in TERM_RE.findall(text):
+        term = phrase or word
+        prefix = not phrase and term.endswith("*")
+        term = term.rstrip("*").replace('"', '""').strip()
+        if term:
+            terms.append(f'"{term}"' + ("*" if prefix else ""))
+    return " ".join(terms)
+
+class SearchIndex:
+    def __init__(self, store):
+        self.store = store
+        with store._connect() as conn:
+            conn.executescript(SCHEMA)
+
+    def add(self, record):
+        self.add_many([record])
+
+    def add_many(self, records):
+        rows = [(r["video_id"], r.get("lang", "en"), r.get("title") or "", r.get("summary") or "",
+                 r.get("transcript") or "") for r in records]
+        # search_docs maps (video_id, lang) to the FTS rowid so re-saving a video replaces its row
+        # without scanning the index
+        with self.store._connect() as conn:
+            for row in rows:
+                found = conn.execute("SELECT id FROM search_docs WHERE video_id = ? AND lang = ?", row[:2]).fetchone()
+                if found:
+                    doc_id = found[0]
+                    conn.execute("DELETE FROM search_index WHERE rowid = ?", (doc_id,))
+                else:
+                    doc_id = conn.execute("INSERT INTO search_docs (video_id, lang) VALUES (?, ?)", row[:2]).lastrowid
+                conn.execute("INSERT INTO search_index (rowid, video_id, lang, title, summary, body) "
+                             "VALUES (?, ?, ?, ?, ?, ?)", (doc_id,) + row)
+
+    def search(self, text, limit=20, lang=None):
+        query = build_query(text)
+        if not query:
+            return []
+        sql = (f"SELECT video_id, lang, title, snippet(search_index, -1, '[', ']', ' ... ', 24) AS snippet, "
+               f"bm25(search_index, {', '.join(map(str, WEIGHTS))}) AS score "
+               f"FROM search_index WHERE search_index MATCH ?")
+        params = [query]
+        if lang:
+            sql += " AND lang = ?"
+            params.append(lang)
+        sql += " ORDER BY score LIMIT ?"
+        params.append(limit)
+        rows = self.store._connect().execute(sql, params).fetchall()
+        return [dict(row, score=round(-row["score"], 4)) for row in rows]
+
+    def count(self):
+        return self.store._connect().execute("SELECT COUNT(*) FROM search_index").fetchone()[0]
+
+    def backfill(self, dir_path=None, batch_size=200):
+        if dir_path is None:
+            dir_path = os.path.join(os.getcwd(), "transcripts")
+        indexed = 0
+        batch = []
+        for record in iter_saved_files(dir_path):
+            record.pop("legacy", None)
+            batch.append(record)
+            if len(batch) >= batch_size:
+                self.add_many(batch)
+                indexed += len(batch)
+                batch = []
+        if batch:
+            self.add_many(batch)
+            indexed += len(batch)
+        return indexed
+
+_indexes = {}
+_lock = threading.Lock()
+
+def get_search_index(dir_path=None):
+    store = get_store(dir_path)
+    if store.path not in _indexes:
+        with _lock:
+            if store.path not in _indexes:
+                _indexes[store.path] = SearchIndex(store)
+    return _indexes[store.path]
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Search saved transcripts and summaries.")
+    parser.add_argument("query", nargs="?", help='Keywords and "quoted phrases"')
+    parser.add_argument("--dir", default=None, help="Transcripts directory (default: ./transcripts)")
+    parser.add_argument("--limit", type=int, default=10)
+    parser.add_argument("--lang", default=None)
+    parser.add_argument("--backfill", action="store_true", help="Index every saved output in the transcripts directory")
+    parser.add_argument("--json", action="store_true")
+    args = parser.parse_args(argv)
+
+    index = get_search_index(args.dir)
+    if args.backfill:
+        print(f"Indexed {index.backfill(args.dir)} videos")
+    if not args.query:
+        return 0
+    results = index.search(args.query, args.limit, args.lang)
+    if args.json:
+        print(json.dumps(results, ensure_ascii=False, indent=2))
+        return 0
+    for r in results:
+        print(f"{r['score']:>8.2f}  {r['video_id']}  {r['title']}\n          {' '.join(r['snippet'].split())}")
+    if not results:
+        print("No matches")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
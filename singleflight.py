@@ -0,0 +1,112 @@
+import os
+import re
+import threading
+import time
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+class _Call:
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+        self.listeners = []
+        self.waiters = 0
+
+    def report(self, *args):
+        for listener in list(self.listeners):
+            listener(*args)
+
+    def wait(self, timeout=None):
+        if not self.done.wait(timeout):
+            raise TimeoutError("Timed out waiting for in-flight pipeline")
+        if self.error is not None:
+            raise self.error
+        return self.result
+
+class SingleFlight:
+    # Concurrent callers for the same key share one execution. Within a process followers wait on the
+    # leader's event; across processes the leader holds an flock on <lock_dir>/<key>.lock, which the OS
+    # releases if the process dies, and re-checks `recheck` once it gets the lock so it can pick up
+    # the result another worker just produced.
+    def __init__(self, lock_dir=None, timeout=600):
+        self.lock_dir = lock_dir
+        self.timeout = timeout
+        self._calls = {}
+        self._lock = threading.Lock()
+
+    def begin(self, key, progress=None):
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+            else:
+                call.waiters += 1
+            if progress:
+                call.listeners.append(progress)
+        return call, leader
+
+    def finish(self, key, call, result=None, error=None):
+        call.result, call.error = result, error
+        with self._lock:
+            if self._calls.get(key) is call:
+                del self._calls[key]
+        call.done.set()
+
+    def in_flight(self):
+        with self._lock:
+            return {key: call.waiters for key, call in self._calls.items()}
+
+    def do(self, key, fn, progress=None, recheck=None):
+        call, leader = self.begin(key, progress)
+        if not leader:
+            return call.wait(self.timeout)
+        try:
+            with self._file_lock(key):
+                result = recheck() if recheck else None
+                if result is None:
+                    result = fn(call.report)
+        except Exception as e:
+            self.finish(key, call, error=e)
+            raise
+        self.finish(key, call, result)
+        return result
+
+    def _file_lock(self, key):
+        if fcntl is None or not self.lock_dir:
+            return _NullLock()
+        os.makedirs(self.lock_dir, exist_ok=True)
+        return _FileLock(os.path.join(self.lock_dir, re.sub(r'[^0-9A-Za-z_.-]', '_', key) + ".lock"), self.timeout)
+
+class _NullLock:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        pass
+
+class _FileLock:
+    def __init__(self, path, timeout):
+        self.path = path
+        self.timeout = timeout
+        self.fd = None
+
+    def __enter__(self):
+        self.fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o644)
+        deadline = time.monotonic() + self.timeout
+        while True:
+            try:
+                fcntl.flock(self.fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                return self
+            except BlockingIOError:
+                # A hung worker should not block the video forever; past the timeout we run unlocked
+                if time.monotonic() >= deadline:
+                    return self
+                time.sleep(0.1)
+
+    def __exit__(self, *exc):
+        os.close(self.fd)
@@ -0,0 +1,277 @@
+import argparse
+import os
+import re
+import sqlite3
+import sys
+import threading
+import zlib
+from array import array
+from datetime import datetime
+
+from transcript import Transcript
+
+SEPARATOR = "=" * 80
+DB_NAME = "transcripts.db"
+COMPRESSION_LEVEL = int(os.environ.get("TRANSCRIPT_COMPRESSION_LEVEL", 1))
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS videos (
+    video_id TEXT NOT NULL,
+    lang TEXT NOT NULL,
+    title TEXT,
+    source_lang TEXT,
+    was_translated INTEGER NOT NULL DEFAULT 0,
+    created_at TEXT NOT NULL,
+    filename TEXT,
+    summary TEXT,
+    PRIMARY KEY (video_id, lang)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS videos_created ON videos (created_at);
+CREATE INDEX IF NOT EXISTS videos_lang_created ON videos (lang, created_at);
+CREATE TABLE IF NOT EXISTS transcripts (
+    video_id TEXT NOT NULL,
+    lang TEXT NOT NULL,
+    body BLOB NOT NULL,
+    PRIMARY KEY (video_id, lang)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS segments (
+    video_id TEXT NOT NULL,
+    lang TEXT NOT NULL,
+    offsets BLOB NOT NULL,
+    starts BLOB NOT NULL,
+    durations BLOB NOT NULL,
+    PRIMARY KEY (video_id, lang)
+) WITHOUT ROWID;
+"""
+
+VIDEO_COLUMNS = ("video_id", "lang", "title", "source_lang", "was_translated", "created_at", "filename", "summary")
+
+def _compress(text):
+    return zlib.compress(text.encode('utf-8'), COMPRESSION_LEVEL)
+
+def _decompress(blob):
+    return zlib.decompress(blob).decode('utf-8')
+
+class TranscriptStore:
+    def __init__(self, path):
+        self.path = path
+        self._local = threading.local()
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        with self._connect() as conn:
+            conn.executescript(SCHEMA)
+
+    def _connect(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30)
+            conn.row_factory = sqlite3.Row
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def put(self, record):
+        self.put_many([record])
+
+    def put_many(self, records):
+        videos = []
+        bodies = []
+        timings = []
+        for r in records:
+            lang = r.get("lang", "en")
+            created_at = r.get("created_at") or datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+            videos.append((r["video_id"], lang, r.get("title"), r.get("source_lang"), int(bool(r.get("was_translated"))),
+                           created_at, r.get("filename"), r.get("summary")))
+            if r.get("transcript") is not None:
+                bodies.append((r["video_id"], lang, _compress(r["transcript"])))
+                # Segment offsets index into the stored text, so they are only kept when they match it exactly
+                offsets, starts, durations = r.get("timings") or (None, None, None)
+                if offsets is not None and offsets[-1] == len(r["transcript"]) + 1:
+                    timings.append((r["video_id"], lang, zlib.compress(offsets.tobytes(), COMPRESSION_LEVEL),
+                                    zlib.compress(starts.tobytes(), COMPRESSION_LEVEL),
+                                    zlib.compress(durations.tobytes(), COMPRESSION_LEVEL)))
+        with self._connect() as conn:
+            conn.executemany(f"INSERT OR REPLACE INTO videos ({', '.join(VIDEO_COLUMNS)}) "
+                             f"VALUES ({', '.join('?' * len(VIDEO_COLUMNS))})", videos)
+            conn.executemany("INSERT OR REPLACE INTO transcripts (video_id, lang, body) VALUES (?, ?, ?)", bodies)
+            # A body rewritten without timings must not keep offsets that pointed into the old text
+            conn.executemany("DELETE FROM segments WHERE video_id = ? AND lang = ?",
+                             [(video_id, lang) for video_id, lang, _ in bodies])
+            conn.executemany("INSERT INTO segments (video_id, lang, offsets, starts, durations) "
+                             "VALUES (?, ?, ?, ?, ?)", timings)
+
+    def get(self, video_id, lang='en'):
+        row = self._connect().execute("SELECT * FROM videos WHERE video_id = ? AND lang = ?",
+                                      (video_id, lang)).fetchone()
+        if row is None:
+            return None
+        result = dict(row)
+        result["was_translated"] = bool(result["was_translated"])
+        return result
+
+    def get_transcript(self, video_id, lang='en'):
+        row = self._connect().execute("SELECT body FROM transcripts WHERE video_id = ? AND lang = ?",
+                                      (video_id, lang)).fetchone()
+        return _decompress(row["body"]) if row else None
+
+    def get_segments(self, video_id, lang='en'):
+        # The stored text plus its segment index as a Transcript, or None for videos saved without timings
+        row = self._connect().execute(
+            "SELECT t.body, s.offsets, s.starts, s.durations FROM transcripts t JOIN segments s "
+            "ON s.video_id = t.video_id AND s.lang = t.lang WHERE t.video_id = ? AND t.lang = ?",
+            (video_id, lang)).fetchone()
+        if row is None:
+            return None
+        unpack = lambda typecode, blob: array(typecode, zlib.decompress(blob))
+        return Transcript.from_timings(_decompress(row["body"]), unpack('q', row["offsets"]),
+                                       unpack('d', row["starts"]), unpack('d', row["durations"]))
+
+    def list(self, lang=None, since=None, until=None, before=None, limit=50):
+        # Keyset pagination: pass the last row's (created_at, video_id) as `before` for the next page
+        clauses, params = [], []
+        if lang:
+            clauses.append("lang = ?")
+            params.append(lang)
+        if since:
+            clauses.append("created_at >= ?")
+            params.append(since)
+        if until:
+            clauses.append("created_at < ?")
+            params.append(until)
+        if before:
+            clauses.append("(created_at, video_id) < (?, ?)")
+            params.extend(before)
+        where = f"WHERE {' AND '.join(clauses)}" if clauses else ""
+        rows = self._connect().execute(
+            f"SELECT video_id, lang, title, source_lang, was_translated, created_at, filename FROM videos {where} "
+            f"ORDER BY created_at DESC, video_id DESC LIMIT ?", params + [limit]).fetchall()
+        return [dict(row) for row in rows]
+
+    def count(self):
+        return self._connect().execute("SELECT COUNT(*) FROM videos").fetchone()[0]
+
+    def import_directory(self, dir_path, batch_size=500):
+        imported = 0
+        batch = []
+        for record in iter_saved_files(dir_path):
+            if record.pop("legacy", False) and self.get(record["video_id"]):
+                continue
+            batch.append(record)
+            if len(batch) >= batch_size:
+                self.put_many(batch)
+                imported += len(batch)
+                batch = []
+        if batch:
+            self.put_many(batch)
+            imported += len(batch)
+        return imported
+
+def parse_saved_file(path):
+    with open(path, encoding='utf-8') as f:
+        text = f.read()
+    head, _, rest = text.partition("\n\n" + SEPARATOR + "\nSUMMARY\n" + SEPARATOR + "\n\n")
+    header = dict(line.partition(": ")[::2] for line in head.splitlines() if ": " in line)
+    if "Video ID" not in header:
+        return None
+    summary, _, body = rest.partition("\n\n" + SEPARATOR + "\nFULL TRANSCRIPT\n" + SEPARATOR + "\n\n")
+    return {
+        "video_id": header["Video ID"],
+        "title": header.get("YouTube Video", ""),
+        "source_lang": header.get("Original Language", "unknown"),
+        "was_translated": header.get("Translated to English") == "True",
+        "created_at": header.get("Date Extracted"),
+        "filename": path,
+        "summary": summary,
+        "transcript": body,
+    }
+
+def iter_saved_files(dir_path):
+    # Full saved outputs carry a header; the older app wrote summary_<id>.txt / transcript_<id>.txt
+    # pairs, which are only used for videos that have no full output
+    names = sorted(n for n in os.listdir(dir_path) if n.endswith(".txt") and os.path.isfile(os.path.join(dir_path, n)))
+    seen = set()
+    legacy = []
+    for name in names:
+        path = os.path.join(dir_path, name)
+        match = re.fullmatch(r"transcript_([0-9A-Za-z_-]{11})\.txt", name)
+        if match:
+            legacy.append((match.group(1), path))
+            continue
+        try:
+            record = parse_saved_file(path)
+        except (OSError, UnicodeDecodeError):
+            continue
+        if record:
+            seen.add(record["video_id"])
+            yield record
+    for video_id, path in legacy:
+        if video_id not in seen and os.path.getsize(path) > 0:
+            summary_path = os.path.join(dir_path, f"summary_{video_id}.txt")
+            summary = ""
+            if os.path.exists(summary_path):
+                with open(summary_path, encoding='utf-8') as f:
+                    summary = f.read()
+            with open(path, encoding='utf-8') as f:
+                body = f.read()
+            yield {
+                "video_id": video_id,
+                "title": f"video_{video_id}",
+                "source_lang": "unknown",
+                "created_at": datetime.fromtimestamp(os.path.getmtime(path)).strftime('%Y-%m-%d %H:%M:%S'),
+                "filename": path,
+                "summary": summary,
+                "transcript": body,
+                "legacy": True,
+            }
+
+_stores = {}
+_lock = threading.Lock()
+
+def store_path(dir_path=None):
+    path = os.environ.get("TRANSCRIPTS_DB")
+    if not path:
+        if dir_path is None:
+            dir_path = os.path.join(os.getcwd(), "transcripts")
+        path = os.path.join(dir_path, DB_NAME)
+    return os.path.abspath(path)
+
+def get_store(dir_path=None):
+    path = store_path(dir_path)
+    if path not in _stores:
+        with _lock:
+            if path not in _stores:
+                _stores[path] = TranscriptStore(path)
+    return _stores[path]
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Manage the indexed transcript store.")
+    parser.add_argument("--dir", default=None, help="Transcripts directory (default: ./transcripts)")
+    commands = parser.add_subparsers(dest="command", required=True)
+    importer = commands.add_parser("import", help="Import existing text files from the transcripts directory")
+    importer.add_argument("source", nargs="?", default=None)
+    listing = commands.add_parser("list", help="List stored videos, newest first")
+    listing.add_argument("--lang", default=None)
+    listing.add_argument("--since", default=None)
+    listing.add_argument("--limit", type=int, default=50)
+    show = commands.add_parser("show", help="Print a stored summary and transcript")
+    show.add_argument("video_id")
+    show.add_argument("--lang", default="en")
+    args = parser.parse_args(argv)
+
+    store = get_store(args.dir)
+    if args.command == "import":
+        source = args.source or args.dir or os.path.join(os.getcwd(), "transcripts")
+        print(f"Imported {store.import_directory(source)} videos into {store.path}")
+    elif args.command == "list":
+        for row in store.list(args.lang, args.since, limit=args.limit):
+            print(f"{row['created_at']}  {row['video_id']}  {row['lang']}  {row['title']}")
+    elif args.command == "show":
+        record = store.get(args.video_id, args.lang)
+        if record is None:
+            print("Not found")
+            return 1
+        print(f"{record['title']}\n\n{record['summary']}\n\n{store.get_transcript(args.video_id, args.lang) or ''}")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
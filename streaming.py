@@ -0,0 +1,105 @@
+import os
+import shutil
+import tempfile
+from array import array
+from concurrent.futures import ThreadPoolExecutor
+
+from Youtube_transcript_translate import (
+    fetch_video, googletrans_code, is_english, output_file, store_result, summarize_basic, transcript_path,
+    write_transcript_header
+)
+from metrics import timed
+from transcript import Transcript
+from translation import TranslationEngine, get_translation_memo
+
+@timed("translation")
+def _translate_chunk(engine, chunk, source_lang):
+    return chunk.with_texts(engine.translate_texts(chunk.texts(), googletrans_code(source_lang), 'en'))
+
+def iter_segment_chunks(transcript_data, source_lang, window=200, engine=None):
+    # source_lang is the language to translate from, or None when the text is already English
+    transcript = Transcript.from_segments(transcript_data)
+    chunks = (transcript[i:i + window] for i in range(0, len(transcript), window))
+    if not source_lang or is_english(source_lang) or source_lang == 'unknown':
+        yield from chunks
+        return
+    engine = engine or TranslationEngine()
+    # Translate the next window while the current one is consumed downstream
+    with ThreadPoolExecutor(max_workers=1, thread_name_prefix="stream") as pool:
+        pending = None
+        for chunk in chunks:
+            future = pool.submit(_translate_chunk, engine, chunk, source_lang)
+            if pending:
+                yield pending.result()
+            pending = future
+        if pending:
+            yield pending.result()
+
+def stream_video(video_id, dir_path=None, window=200, engine=None):
+    if dir_path is None:
+        dir_path = os.path.join(os.getcwd(), "transcripts")
+    os.makedirs(dir_path, exist_ok=True)
+    # Windows are translated independently, so resuming relies on the shared memo rather than checkpoints
+    engine = engine or TranslationEngine(memo=get_translation_memo(dir_path))
+    yield {"event": "stage", "stage": "fetching"}
+    video_title, (transcript_data, source_lang, needs_translation) = fetch_video(video_id, dir_path)
+    yield {"event": "title", "title": video_title, "source_lang": source_lang}
+    if not transcript_data:
+        yield {"event": "error", "error": "Transcript not fetched"}
+        return
+    was_translated = not is_english(source_lang)
+    stage = "translating" if needs_translation else "formatting"
+    yield {"event": "stage", "stage": stage}
+    total = len(transcript_data)
+    done = 0
+    body = tempfile.NamedTemporaryFile('w+', encoding='utf-8', dir=dir_path, suffix=".part", delete=False)
+    # Segment index for the text as written: windows are joined by one space, like segments within a window
+    offsets, starts, durations = array('q', [0]), array('d'), array('d')
+    try:
+        translate_from = source_lang if needs_translation else None
+        for chunk in iter_segment_chunks(transcript_data, translate_from, window, engine):
+            text = chunk.text()
+            if done:
+                body.write(" ")
+            body.write(text)
+            chunk_offsets, chunk_starts, chunk_durations = chunk.timings()
+            base = offsets[-1]
+            offsets.extend(base + o for o in chunk_offsets[1:])
+            starts.extend(chunk_starts)
+            durations.extend(chunk_durations)
+            done += len(chunk)
+            yield {"event": "progress", "stage": stage, "done": done, "total": total}
+            yield {"event": "text", "text": text}
+        yield {"event": "stage", "stage": "summarizing"}
+        body.seek(0)
+        summary = summarize_basic(body.read())
+        yield {"event": "summary", "summary": summary}
+        yield {"event": "stage", "stage": "saving"}
+        with timed("save"):
+            filename = transcript_path(video_id, dir_path)
+            with output_file(filename) as f:
+                write_transcript_header(f, video_title, video_id, source_lang, was_translated, summary)
+                body.seek(0)
+                shutil.copyfileobj(body, f)
+            body.seek(0)
+            store_result({
+                "video_id": video_id,
+                "title": video_title,
+                "source_lang": source_lang,
+                "was_translated": was_translated,
+                "filename": filename,
+                "summary": summary,
+                "transcript": body.read(),
+                "timings": (offsets, starts, durations),
+            }, dir_path)
+    finally:
+        body.close()
+        os.unlink(body.name)
+    yield {"event": "done", "result": {
+        "video_id": video_id,
+        "title": video_title,
+        "source_lang": source_lang,
+        "was_translated": was_translated,
+        "summary": summary,
+        "filename": filename,
+    }}
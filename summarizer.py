@@ -0,0 +1,78 @@
+import re
+from collections import defaultdict
+from itertools import count
+
+import numpy as np
+from scipy import sparse
+
+SENTENCE_RE = re.compile(r'[.!?]+')
+SEPARATOR = "\x1f"
+# Bytes kept by tokenization: ASCII letters/digits, apostrophes, the sentence separator and all non-ASCII
+# (UTF-8) bytes; everything else becomes whitespace
+TOKEN_TABLE = bytes(c if c >= 128 or chr(c) in "abcdefghijklmnopqrstuvwxyz0123456789'" + SEPARATOR else 32
+                    for c in range(256))
+STOPWORDS = frozenset(b"""
+a about above after again against all am an and any are as at be because been before being below between
+both but by can could did do does doing down during each few for from further had has have having he her
+here hers herself him himself his how i if in into is it its itself just like me more most my myself no nor
+not now of off on once only or other our ours ourselves out over own really right same she should so some
+such than that the their theirs them themselves then there these they this those through to too under until
+up very was we were what when where which while who whom why will with would you your yours yourself
+yourselves yeah okay oh um uh gonna kind sort thing things know think going get got
+""".split())
+
+def split_sentences(text, min_chars=20):
+    sentences = (s.strip() for s in SENTENCE_RE.split(text))
+    return [s for s in sentences if len(s) > min_chars]
+
+def tfidf_matrix(sentences):
+    # Tokenize everything in one pass with a separator token between sentences; stopwords and
+    # the separator take the first vocabulary ids so they can be masked out in bulk
+    vocab = defaultdict(count().__next__)
+    for word in STOPWORDS:
+        vocab[word]
+    separator = vocab[SEPARATOR.encode()]
+    reserved = len(vocab)
+    text = f" {SEPARATOR} ".join(sentences).lower().encode('utf-8')
+    tokens = text.translate(TOKEN_TABLE).split()
+    ids = np.fromiter(map(vocab.__getitem__, tokens), dtype=np.int64, count=len(tokens))
+    rows = np.cumsum(ids == separator)
+    keep = ids >= reserved
+    n = len(sentences)
+    X = sparse.csr_matrix((np.ones(keep.sum(), dtype=np.float32), (rows[keep], ids[keep] - reserved)),
+                          shape=(n, max(len(vocab) - reserved, 1)))
+    df = np.bincount(X.indices, minlength=X.shape[1])
+    idf = np.log((1.0 + n) / (1.0 + df)).astype(np.float32) + 1.0
+    X.data = np.log1p(X.data) * idf[X.indices]
+    norms = np.sqrt(np.asarray(X.multiply(X).sum(axis=1)).ravel())
+    norms[norms == 0] = 1.0
+    return sparse.diags(1.0 / norms) @ X
+
+def centrality_scores(X):
+    # Sum of cosine similarities to every other sentence, i.e. X @ X.T @ 1 without forming X @ X.T
+    centroid = np.asarray(X.sum(axis=0)).ravel()
+    return X @ centroid
+
+def textrank_scores(X, damping=0.85, iterations=50, tol=1e-6):
+    n = X.shape[0]
+    self_sim = np.asarray(X.multiply(X).sum(axis=1)).ravel()
+    similarity = lambda v: X @ (X.T @ v) - self_sim * v
+    degree = similarity(np.ones(n))
+    degree[degree <= 0] = 1.0
+    rank = np.full(n, 1.0 / n)
+    for _ in range(iterations):
+        updated = (1 - damping) / n + damping * similarity(rank / degree)
+        if np.abs(updated - rank).sum() < tol:
+            return updated
+        rank = updated
+    return rank
+
+SCORERS = {"tfidf": centrality_scores, "textrank": textrank_scores}
+
+def extract_key_sentences(text, num_sentences=10, method="tfidf"):
+    sentences = split_sentences(text)
+    if len(sentences) <= num_sentences:
+        return sentences
+    scores = SCORERS[method](tfidf_matrix(sentences))
+    top = np.argpartition(-scores, num_sentences)[:num_sentences]
+    return [sentences[i] for i in np.sort(top)]
@@ -0,0 +1,331 @@
+import argparse
+import hashlib
+import json
+import os
+import re
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from urllib.parse import parse_qs, urlsplit
+
+from batch import load_urls, run_batch
+from store import get_store
+
+FEED_URL = "https://www.youtube.com/feeds/videos.xml?{kind}={value}"
+# The Atom feed only ever carries a source's latest entries
+FEED_LIMIT = 15
+PLAYLIST_ITEMS_URL = "https://www.googleapis.com/youtube/v3/playlistItems"
+HANDLE_URL = "https://www.youtube.com/{handle}"
+CHANNEL_ID_RE = re.compile(r'^UC[0-9A-Za-z_-]{22}$')
+PLAYLIST_ID_RE = re.compile(r'^(?:PL|UU|OL|FL|LL|RD)[0-9A-Za-z_-]{10,}$')
+PAGE_CHANNEL_RE = re.compile(r'"(?:externalId|channelId)":"(UC[0-9A-Za-z_-]{22})"|/channel/(UC[0-9A-Za-z_-]{22})')
+ATOM = "{http://www.w3.org/2005/Atom}"
+YT = "{http://www.youtube.com/xml/schemas/2015}"
+
+SYNC_SCHEMA = """
+CREATE TABLE IF NOT EXISTS sync_videos (
+    video_id TEXT PRIMARY KEY,
+    hash TEXT NOT NULL,
+    source TEXT,
+    synced_at TEXT NOT NULL
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS sync_sources (
+    source TEXT PRIMARY KEY,
+    state TEXT,
+    synced_at TEXT NOT NULL
+) WITHOUT ROWID;
+"""
+
+def entry_hash(entry):
+    # A video counts as changed when its listed title or update time moves, not on every view-count tick
+    return hashlib.sha1(f"{entry.get('title', '')}\0{entry.get('updated', '')}".encode('utf-8')).hexdigest()
+
+def parse_source(source):
+    # Returns ("channel_id" | "playlist_id" | "handle", value) for a channel/playlist URL, @handle or raw ID
+    source = source.strip()
+    parts = urlsplit(source if "//" in source else f"https://www.youtube.com/{source.lstrip('/')}")
+    query = parse_qs(parts.query)
+    if query.get("list"):
+        return "playlist_id", query["list"][0]
+    if query.get("channel_id"):
+        return "channel_id", query["channel_id"][0]
+    segments = [s for s in parts.path.split("/") if s]
+    if len(segments) >= 2 and segments[0] == "channel":
+        return "channel_id", segments[1]
+    if segments and segments[0].startswith("@"):
+        return "handle", segments[0]
+    if len(segments) >= 2 and segments[0] in ("c", "user"):
+        return "handle", "/".join(segments[:2])
+    if segments and CHANNEL_ID_RE.match(segments[0]):
+        return "channel_id", segments[0]
+    if segments and PLAYLIST_ID_RE.match(segments[0]):
+        return "playlist_id", segments[0]
+    raise ValueError(f"Not a channel or playlist: {source}")
+
+class RssLister:
+    # Lists a channel's or playlist's latest uploads from its public Atom feed (no API key). The feed is
+    # small and bounded, and a conditional GET lets YouTube answer 304 for sources with nothing new.
+    page_limit = FEED_LIMIT
+
+    def __init__(self, session=None):
+        self.session = session
+
+    def _session(self):
+        if self.session is None:
+            from http_client import get_session
+            self.session = get_session()
+        return self.session
+
+    def resolve(self, handle):
+        response = self._session().get(HANDLE_URL.format(handle=handle))
+        response.raise_for_status()
+        match = PAGE_CHANNEL_RE.search(response.text)
+        if not match:
+            raise ValueError(f"Could not resolve channel for {handle}")
+        return match.group(1) or match.group(2)
+
+    def list(self, source, state=None):
+        # Returns (entries, state); entries is None when the feed has not changed since `state`
+        state = dict(state or {})
+        kind, value = parse_source(source)
+        if kind == "handle":
+            kind, value = "channel_id", state.get("channel_id") or self.resolve(value)
+            state["channel_id"] = value
+        headers = {}
+        if state.get("etag"):
+            headers["If-None-Match"] = state["etag"]
+        if state.get("last_modified"):
+            headers["If-Modified-Since"] = state["last_modified"]
+        response = self._session().get(FEED_URL.format(kind=kind, value=value), headers=headers)
+        if response.status_code == 304:
+            return None, state
+        response.raise_for_status()
+        state["etag"] = response.headers.get("ETag")
+        state["last_modified"] = response.headers.get("Last-Modified")
+        return parse_feed(response.content), state
+
+class ApiLister:
+    # Pages through a channel's uploads or a playlist with the YouTube Data API, newest first. Only used to
+    # backfill sources whose feed was cut off, and it stops at the first page that reaches a video the
+    # manifest already has, so a backfill costs one or two requests per 50 missed videos.
+    def __init__(self, api_key, session=None, max_items=None):
+        self.api_key = api_key
+        self.rss = RssLister(session)
+        self.max_items = max_items or int(os.environ.get("SYNC_BACKFILL_MAX", 500))
+
+    def playlist_id(self, source, state=None):
+        kind, value = parse_source(source)
+        if kind == "handle":
+            value = (state or {}).get("channel_id") or self.rss.resolve(value)
+            kind = "channel_id"
+        # A channel's uploads are the playlist with the same suffix
+        return "UU" + value[2:] if kind == "channel_id" else value
+
+    def page(self, source, known, state=None):
+        playlist_id = self.playlist_id(source, state)
+        entries, token = [], None
+        while len(entries) < self.max_items:
+            params = {"part": "snippet", "playlistId": playlist_id, "maxResults": 50, "key": self.api_key}
+            if token:
+                params["pageToken"] = token
+            response = self.rss._session().get(PLAYLIST_ITEMS_URL, params=params)
+            response.raise_for_status()
+            data = response.json()
+            page = [{"video_id": item["snippet"]["resourceId"]["videoId"], "title": item["snippet"].get("title", ""),
+                     "published": item["snippet"].get("publishedAt", ""),
+                     "updated": item["snippet"].get("publishedAt", "")}
+                    for item in data.get("items", []) if item["snippet"].get("resourceId", {}).get("videoId")]
+            entries.extend(page)
+            token = data.get("nextPageToken")
+            if not token or known([e["video_id"] for e in page]):
+                break
+        return entries[:self.max_items]
+
+def get_backfill(session=None):
+    api_key = os.environ.get("YOUTUBE_API_KEY")
+    return ApiLister(api_key, session) if api_key else None
+
+def parse_feed(content):
+    import xml.etree.ElementTree as ET
+    entries = []
+    for node in ET.fromstring(content).iter(f"{ATOM}entry"):
+        video_id = node.findtext(f"{YT}videoId")
+        if video_id:
+            entries.append({
+                "video_id": video_id,
+                "title": node.findtext(f"{ATOM}title", ""),
+                "published": node.findtext(f"{ATOM}published", ""),
+                "updated": node.findtext(f"{ATOM}updated", ""),
+            })
+    return entries
+
+class SyncManifest:
+    # Processed video IDs with the listing hash they were processed at, plus per-source lister state
+    # (feed validators, resolved channel IDs), kept in the transcript store next to the videos themselves
+    def __init__(self, store):
+        self.store = store
+        with store._connect() as conn:
+            conn.executescript(SYNC_SCHEMA)
+
+    def hashes(self, video_ids):
+        found = {}
+        conn = self.store._connect()
+        video_ids = list(video_ids)
+        for i in range(0, len(video_ids), 500):
+            chunk = video_ids[i:i + 500]
+            rows = conn.execute(f"SELECT video_id, hash FROM sync_videos "
+                                f"WHERE video_id IN ({','.join('?' * len(chunk))})", chunk).fetchall()
+            found.update((row["video_id"], row["hash"]) for row in rows)
+        return found
+
+    def mark(self, items):
+        # items: (video_id, hash, source)
+        now = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+        with self.store._connect() as conn:
+            conn.executemany("INSERT OR REPLACE INTO sync_videos (video_id, hash, source, synced_at) "
+                             "VALUES (?, ?, ?, ?)", [(video_id, h, source, now) for video_id, h, source in items])
+
+    def source_state(self, source):
+        row = self.store._connect().execute("SELECT state FROM sync_sources WHERE source = ?", (source,)).fetchone()
+        return json.loads(row["state"]) if row and row["state"] else {}
+
+    def save_source(self, source, state):
+        with self.store._connect() as conn:
+            conn.execute("INSERT OR REPLACE INTO sync_sources (source, state, synced_at) VALUES (?, ?, ?)",
+                         (source, json.dumps(state), datetime.now().strftime('%Y-%m-%d %H:%M:%S')))
+
+    def count(self):
+        return self.store._connect().execute("SELECT COUNT(*) FROM sync_videos").fetchone()[0]
+
+def list_sources(sources, lister, manifest, workers=8):
+    # Lists every source concurrently; a failing source is reported and retried on the next sync
+    def list_one(source):
+        try:
+            entries, state = lister.list(source, manifest.source_state(source))
+            return source, entries, state, None
+        except Exception as e:
+            return source, None, None, f"{type(e).__name__}: {e}"
+
+    listed = {}
+    states = {}
+    errors = {}
+    with ThreadPoolExecutor(max_workers=max(1, workers), thread_name_prefix="sync") as pool:
+        for source, entries, state, error in pool.map(list_one, sources):
+            if error:
+                errors[source] = error
+                continue
+            states[source] = state
+            if entries is not None:
+                listed[source] = entries
+    return listed, states, errors
+
+def truncated_sources(listed, lister, manifest):
+    # A listing that fills the lister's page with nothing already processed may have cut off older videos:
+    # a source's first sync, or more uploads since the last one than the feed holds
+    limit = getattr(lister, "page_limit", None)
+    if not limit:
+        return []
+    return [source for source, entries in listed.items()
+            if len(entries) >= limit and not manifest.hashes(e["video_id"] for e in entries)]
+
+def backfill_sources(sources, listed, states, backfill, manifest, errors):
+    # Replaces each cut-off listing with a paged one; the feed's entries are kept for the videos it has, so
+    # their hashes stay what later feed listings will compare against. Returns the sources left cut off.
+    left = []
+    for source in sources:
+        try:
+            paged = backfill.page(source, manifest.hashes, states.get(source))
+        except Exception as e:
+            errors[source] = f"Backfill failed: {type(e).__name__}: {e}"
+            left.append(source)
+            continue
+        in_feed = {e["video_id"] for e in listed[source]}
+        listed[source] = listed[source] + [e for e in paged if e["video_id"] not in in_feed]
+    return left
+
+def pending_videos(listed, manifest):
+    # New or changed videos in listing order, each once even if several followed sources include it
+    candidates = {}
+    for source, entries in listed.items():
+        for entry in entries:
+            candidates.setdefault(entry["video_id"], (entry_hash(entry), source))
+    known = manifest.hashes(candidates)
+    return [(video_id, h, source) for video_id, (h, source) in candidates.items() if known.get(video_id) != h]
+
+def sync(sources, lister=None, dir_path=None, workers=4, list_workers=8, process=None, dry_run=False,
+         progress=None, backfill=None):
+    lister = lister or RssLister()
+    backfill = backfill if backfill is not None else get_backfill()
+    manifest = SyncManifest(get_store(dir_path))
+    start = time.perf_counter()
+    listed, states, errors = list_sources(sources, lister, manifest, list_workers)
+    truncated = truncated_sources(listed, lister, manifest)
+    if truncated and backfill:
+        truncated = backfill_sources(truncated, listed, states, backfill, manifest, errors)
+    pending = pending_videos(listed, manifest)
+    report = {
+        "sources": len(sources),
+        "unchanged_sources": sum(1 for source in sources if source not in listed and source not in errors),
+        "listed": sum(len(entries) for entries in listed.values()),
+        "pending": len(pending),
+        "succeeded": 0,
+        "failed": 0,
+        "errors": errors,
+        "truncated": truncated,
+        "videos": [],
+    }
+    if dry_run:
+        report["videos"] = [{"video_id": video_id, "source": source, "status": "pending"}
+                            for video_id, _, source in pending]
+        report["seconds"] = round(time.perf_counter() - start, 3)
+        return report
+    failed_sources = set()
+    if pending:
+        # Only successes go into the manifest, and a source with a failed video keeps its old feed state,
+        # so the failure is listed and retried on the next sync instead of hiding behind a 304
+        batch = run_batch([video_id for video_id, _, _ in pending], workers, dir_path, process=process,
+                          progress=progress)
+        ok = {v["video_id"] for v in batch["videos"] if v["status"] == "ok"}
+        manifest.mark([item for item in pending if item[0] in ok])
+        failed_ids = {video_id for video_id, _, _ in pending if video_id not in ok}
+        failed_sources = {source for source, entries in listed.items()
+                          if any(entry["video_id"] in failed_ids for entry in entries)}
+        report.update(succeeded=batch["succeeded"], failed=batch["failed"], videos=batch["videos"],
+                      manifest=batch["manifest"])
+    # Likewise a source whose backfill failed, so it is paged again next time
+    failed_sources |= {source for source in truncated if source in errors}
+    for source, state in states.items():
+        if source not in failed_sources:
+            manifest.save_source(source, state)
+    report["seconds"] = round(time.perf_counter() - start, 3)
+    return report
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Process new or changed videos from followed channels and playlists.")
+    parser.add_argument("sources", help="File with one channel/playlist URL, @handle or ID per line, '-' for stdin")
+    parser.add_argument("-w", "--workers", type=int, default=int(os.environ.get("BATCH_WORKERS", 4)))
+    parser.add_argument("--list-workers", type=int, default=int(os.environ.get("SYNC_LIST_WORKERS", 8)))
+    parser.add_argument("-o", "--out", default=None, help="Output directory for transcripts")
+    parser.add_argument("-n", "--dry-run", action="store_true", help="Only list what would be processed")
+    args = parser.parse_args(argv)
+    sources = load_urls(args.sources)
+    progress = lambda stage, done, total: print(f"Processed: {done}/{total} videos", end='\r')
+    report = sync(sources, dir_path=args.out, workers=args.workers, list_workers=args.list_workers,
+                  dry_run=args.dry_run, progress=progress)
+    for source, error in report["errors"].items():
+        print(f"Listing failed for {source}: {error}")
+    for source in report["truncated"]:
+        hint = "" if os.environ.get("YOUTUBE_API_KEY") else " (set YOUTUBE_API_KEY to page through the full listing)"
+        print(f"Warning: {source} listed only its latest videos and none were processed before; "
+              f"older videos may be missing{hint}")
+    if args.dry_run:
+        for video in report["videos"]:
+            print(f"{video['video_id']}  {video['source']}")
+    print(f"\n{report['sources']} sources ({report['unchanged_sources']} unchanged, {len(report['errors'])} failed), "
+          f"{report['listed']} videos listed, {report['pending']} new or changed, "
+          f"{report['succeeded']} processed in {report['seconds']}s")
+    return 0 if report["failed"] == 0 and not report["errors"] else 1
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,167 @@
+import gzip
+import os
+import time
+
+import pytest
+
+import app
+from compaction import ARCHIVE_DIR, Compactor, compact, get_archive
+from store import DB_NAME, SEPARATOR, get_store
+
+VIDEO = "aaaaaaaaaaA"
+DAY = 86400
+
+@pytest.fixture
+def store_dir(tmp_path, monkeypatch):
+    monkeypatch.delenv("TRANSCRIPTS_DB", raising=False)
+    return str(tmp_path)
+
+def output_text(video_id, summary="A summary.", transcript="The full transcript."):
+    return (f"YouTube Video: Title\nVideo ID: {video_id}\nURL: https://www.youtube.com/watch?v={video_id}\n"
+            f"Original Language: en\nTranslated to English: False\nDate Extracted: 2026-01-01 00:00:00\n\n"
+            + SEPARATOR + "\nSUMMARY\n" + SEPARATOR + "\n\n" + summary + "\n\n"
+            + SEPARATOR + "\nFULL TRANSCRIPT\n" + SEPARATOR + "\n\n" + transcript)
+
+def write(dir_path, name, text, age=0):
+    path = os.path.join(dir_path, name)
+    with open(path, 'w', encoding='utf-8') as f:
+        f.write(text)
+    when = time.time() - age
+    os.utime(path, (when, when))
+    return path
+
+def reference(dir_path, path, video_id=VIDEO, lang="en"):
+    get_store(dir_path).put({"video_id": video_id, "lang": lang, "filename": path, "transcript": "text"})
+
+def run(dir_path, **kwargs):
+    kwargs.setdefault("archive_after", 365 * DAY)
+    return Compactor(dir_path, **kwargs).run()
+
+def names(dir_path):
+    return sorted(n for n in os.listdir(dir_path) if n.endswith(".txt"))
+
+def test_older_output_of_a_video_is_dropped(store_dir):
+    write(store_dir, "old.txt", output_text(VIDEO, transcript="first run"), age=DAY)
+    write(store_dir, f"{VIDEO}_en.txt", output_text(VIDEO, transcript="second run"))
+    report = run(store_dir)
+    assert names(store_dir) == [f"{VIDEO}_en.txt"]
+    assert report["duplicates"] == 1
+
+def test_output_the_store_points_at_wins(store_dir):
+    old = write(store_dir, "old.txt", output_text(VIDEO, transcript="first run"), age=DAY)
+    write(store_dir, f"{VIDEO}_en.txt", output_text(VIDEO, transcript="second run"))
+    reference(store_dir, old)
+    run(store_dir)
+    assert names(store_dir) == ["old.txt"]
+
+def test_legacy_files_matching_the_output_are_dropped(store_dir):
+    write(store_dir, f"{VIDEO}_en.txt", output_text(VIDEO, "Key points.", "Every word said."))
+    write(store_dir, f"summary_{VIDEO}.txt", "Key points.")
+    write(store_dir, f"transcript_{VIDEO}.txt", "Every word said.")
+    report = run(store_dir)
+    assert names(store_dir) == [f"{VIDEO}_en.txt"]
+    assert report["duplicates"] == 2
+
+def test_legacy_files_that_differ_from_the_output_are_kept(store_dir):
+    write(store_dir, f"{VIDEO}_en.txt", output_text(VIDEO, "Key points.", "[0:00] Every word said."))
+    write(store_dir, f"summary_{VIDEO}.txt", "Other key points.")
+    write(store_dir, f"transcript_{VIDEO}.txt", "Every word said.")
+    report = run(store_dir)
+    assert names(store_dir) == [f"{VIDEO}_en.txt", f"summary_{VIDEO}.txt", f"transcript_{VIDEO}.txt"]
+    assert report["duplicates"] == 0
+
+def test_identical_copies_are_deduped_and_the_store_repointed(store_dir):
+    text = output_text(VIDEO)
+    old = write(store_dir, f"{VIDEO}_de.txt", text, age=DAY)
+    new = write(store_dir, f"{VIDEO}_en.txt", text)
+    reference(store_dir, old, lang="de")
+    reference(store_dir, new, lang="en")
+    run(store_dir)
+    assert names(store_dir) == [f"{VIDEO}_en.txt"]
+    assert get_store(store_dir).get(VIDEO, "de")["filename"] == new
+
+def test_only_old_empty_files_are_removed(store_dir):
+    write(store_dir, "fresh.txt", "")
+    write(store_dir, "stale.txt", "", age=DAY)
+    report = run(store_dir)
+    assert names(store_dir) == ["fresh.txt"]
+    assert report["empty"] == 1
+
+def test_cold_outputs_move_into_the_archive(store_dir):
+    path = write(store_dir, f"{VIDEO}_en.txt", output_text(VIDEO), age=60 * DAY)
+    report = run(store_dir, archive_after=30 * DAY)
+    assert report["archived"] == 1
+    assert not os.path.exists(path)
+    member, data = get_archive(store_dir).read_raw(f"{VIDEO}_en.txt")
+    assert gzip.decompress(data).decode('utf-8') == output_text(VIDEO)
+    assert member["size"] == len(output_text(VIDEO).encode('utf-8'))
+
+@pytest.mark.parametrize("accept", ["gzip", "identity"])
+def test_archived_output_is_served_by_the_app(store_dir, monkeypatch, accept):
+    text = output_text(VIDEO, transcript="word " * 1000)
+    path = write(store_dir, f"{VIDEO}_en.txt", text, age=60 * DAY)
+    reference(store_dir, path)
+    run(store_dir, archive_after=30 * DAY)
+    monkeypatch.setattr(app.result_cache, "_store", get_store(store_dir))
+    response = app.app.test_client().get(f"/videos/{VIDEO}/transcript", headers={"Accept-Encoding": accept})
+    assert response.status_code == 200
+    body = gzip.decompress(response.data) if accept == "gzip" else response.data
+    assert response.headers.get("Content-Encoding") == (accept if accept == "gzip" else None)
+    assert body.decode('utf-8') == text
+
+def test_budget_archives_then_evicts_least_recently_used(store_dir):
+    ids = [f"{n:010d}B" for n in range(4)]
+    lengths = []
+    for n, video_id in enumerate(ids):
+        text = output_text(video_id, transcript=os.urandom(2000).hex())
+        write(store_dir, f"{video_id}_en.txt", text, age=(4 - n) * DAY)
+        lengths.append(len(gzip.compress(text.encode('utf-8'), 9, mtime=0)))
+    budget = sum(lengths[2:])
+    report = run(store_dir, budget=budget)
+    # Every live file goes into the archive before any member is evicted, oldest first
+    assert names(store_dir) == []
+    assert report["archived"] == 4
+    assert report["evicted"] == 2
+    archive = get_archive(store_dir)
+    assert [archive.get(f"{video_id}_en.txt") is not None for video_id in ids] == [False, False, True, True]
+    assert report["bytes"] == budget
+
+def test_dry_run_plans_the_same_as_a_real_run(store_dir):
+    ids = [f"{n:010d}C" for n in range(4)]
+    for n, video_id in enumerate(ids):
+        write(store_dir, f"{video_id}_en.txt", output_text(video_id, transcript=os.urandom(2000).hex()),
+              age=(4 - n) * DAY)
+    planned = run(store_dir, budget=5000, dry_run=True)
+    done = run(store_dir, budget=5000)
+    assert planned["actions"] == done["actions"]
+
+def snapshot(dir_path):
+    found = {}
+    for root, dirs, files in os.walk(dir_path):
+        for name in dirs + files:
+            st = os.lstat(os.path.join(root, name))
+            found[os.path.relpath(os.path.join(root, name), dir_path)] = (st.st_size, st.st_mtime_ns)
+    return found
+
+def test_dry_run_writes_nothing(store_dir):
+    write(store_dir, f"{VIDEO}_en.txt", output_text(VIDEO), age=60 * DAY)
+    write(store_dir, "stale.txt", "", age=DAY)
+    before = snapshot(store_dir)
+    report = compact(store_dir, budget=1, archive_after=30 * DAY, dry_run=True)
+    assert report["archived"] == 1 and report["empty"] == 1
+    assert snapshot(store_dir) == before
+    assert not os.path.exists(os.path.join(store_dir, DB_NAME))
+    assert not os.path.exists(os.path.join(store_dir, ARCHIVE_DIR))
+
+def test_dry_run_over_an_existing_store_and_archive_writes_nothing(store_dir):
+    old = write(store_dir, "old.txt", output_text("bbbbbbbbbbB"), age=60 * DAY)
+    reference(store_dir, old, video_id="bbbbbbbbbbB")
+    compact(store_dir, archive_after=30 * DAY)
+    # As in a fresh process: closing the last connections removes their -wal/-shm files
+    for db in (get_store(store_dir), get_archive(store_dir)):
+        db._local.__dict__.pop("conn").close()
+    write(store_dir, f"{VIDEO}_en.txt", output_text(VIDEO), age=60 * DAY)
+    before = snapshot(store_dir)
+    report = compact(store_dir, budget=1, archive_after=30 * DAY, dry_run=True)
+    assert report["archived"] == 1 and report["evicted"] == 2
+    assert snapshot(store_dir) == before
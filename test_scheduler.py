@@ -0,0 +1,108 @@
+import asyncio
+import time
+
+import pytest
+
+from fakes import FakeUpstream
+from http_client import PooledSession
+from scheduler import UPSTREAM_RETRIES, CircuitOpenError, FetchScheduler
+
+def session_for(**kwargs):
+    kwargs.setdefault("backoff", 0.01)
+    return PooledSession(pool_size=2, timeout=(1, 2), scheduler=FetchScheduler(**kwargs))
+
+def test_429_waits_for_retry_after():
+    with FakeUpstream([(429, {"error": "slow down"}, {"Retry-After": "0.3"})]) as upstream:
+        response = session_for(retries=2).get(upstream.url + "/title")
+    assert response.status_code == 200
+    assert len(upstream.requests) == 2
+    assert upstream.requests[1][0] - upstream.requests[0][0] >= 0.3
+
+def test_5xx_backs_off_then_succeeds():
+    with FakeUpstream([(503, {}, {}), (502, {}, {})]) as upstream:
+        response = session_for(retries=3).get(upstream.url + "/title")
+    assert response.status_code == 200
+    assert len(upstream.requests) == 3
+
+def test_5xx_returns_last_response_once_retries_run_out():
+    with FakeUpstream([(500, {}, {})] * 3) as upstream:
+        response = session_for(retries=2).get(upstream.url + "/title")
+    assert response.status_code == 500
+    assert len(upstream.requests) == 3
+
+def test_only_retries_actually_made_are_counted():
+    scheduler = FetchScheduler(retries=2, backoff=0.01)
+
+    def refused():
+        raise ConnectionError("refused")
+
+    before = UPSTREAM_RETRIES.value(host="retries.example", reason="ConnectionError")
+    with pytest.raises(ConnectionError):
+        scheduler.call("retries.example", refused, retry_on=(ConnectionError,))
+    assert UPSTREAM_RETRIES.value(host="retries.example", reason="ConnectionError") - before == 2
+
+def test_breaker_opens_then_half_open_probe_closes_it():
+    with FakeUpstream([(503, {}, {}), (503, {}, {})]) as upstream:
+        session = session_for(retries=0, threshold=2, cooldown=0.2)
+        assert session.get(upstream.url).status_code == 503
+        assert session.get(upstream.url).status_code == 503
+        breaker = session.scheduler.host(upstream.host).breaker
+        assert breaker.state == "open"
+        with pytest.raises(CircuitOpenError):
+            session.get(upstream.url)
+        assert len(upstream.requests) == 2
+        time.sleep(0.25)
+        assert breaker.state == "half-open"
+        assert session.get(upstream.url).status_code == 200
+        assert breaker.state == "closed"
+        assert session.get(upstream.url).status_code == 200
+
+def test_failed_probe_reopens_the_breaker():
+    with FakeUpstream([(503, {}, {}), (503, {}, {})]) as upstream:
+        session = session_for(retries=0, threshold=1, cooldown=0.2)
+        assert session.get(upstream.url).status_code == 503
+        time.sleep(0.25)
+        assert session.get(upstream.url).status_code == 503
+        assert session.scheduler.host(upstream.host).breaker.state == "open"
+
+def test_non_retryable_error_in_probe_releases_the_breaker():
+    scheduler = FetchScheduler(retries=0, threshold=1, cooldown=0.1)
+
+    def refused():
+        raise ConnectionError("refused")
+
+    def truncated():
+        raise ValueError("truncated body")
+
+    with pytest.raises(ConnectionError):
+        scheduler.call("example.com", refused, retry_on=(ConnectionError,))
+    time.sleep(0.15)
+    with pytest.raises(ValueError):
+        scheduler.call("example.com", truncated, retry_on=(ConnectionError,))
+    # The failed probe reopened the circuit instead of leaving it stuck half-open
+    time.sleep(0.15)
+    assert scheduler.call("example.com", lambda: "ok", retry_on=(ConnectionError,)) == "ok"
+    assert scheduler.host("example.com").breaker.state == "closed"
+
+def test_non_retryable_error_in_async_probe_releases_the_breaker():
+    scheduler = FetchScheduler(retries=0, threshold=1, cooldown=0.1)
+
+    async def refused():
+        raise ConnectionError("refused")
+
+    async def cancelled():
+        raise asyncio.CancelledError()
+
+    async def ok():
+        return "ok"
+
+    async def run():
+        with pytest.raises(ConnectionError):
+            await scheduler.acall("example.com", refused, retry_on=(ConnectionError,))
+        await asyncio.sleep(0.15)
+        with pytest.raises(asyncio.CancelledError):
+            await scheduler.acall("example.com", cancelled, retry_on=(ConnectionError,))
+        await asyncio.sleep(0.15)
+        return await scheduler.acall("example.com", ok, retry_on=(ConnectionError,))
+
+    assert asyncio.run(run()) == "ok"
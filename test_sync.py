@@ -0,0 +1,101 @@
+import pytest
+
+from fakes import FakeLister
+from sync import sync
+
+CHANNEL = "https://www.youtube.com/channel/UCaaaaaaaaaaaaaaaaaaaaaa"
+PLAYLIST = "https://www.youtube.com/playlist?list=PLbbbbbbbbbbbbbbbb"
+MISSING = "@gone"
+
+def video_id(n):
+    return f"{n:010d}A"
+
+@pytest.fixture
+def store_dir(tmp_path, monkeypatch):
+    monkeypatch.delenv("TRANSCRIPTS_DB", raising=False)
+    monkeypatch.delenv("YOUTUBE_API_KEY", raising=False)
+    return str(tmp_path)
+
+class Recorder:
+    def __init__(self, fail=()):
+        self.fail = set(fail)
+        self.processed = []
+
+    def __call__(self, video_id):
+        self.processed.append(video_id)
+        return None if video_id in self.fail else {"video_id": video_id, "title": video_id}
+
+def lister_with(*sources, count=3):
+    lister = FakeLister({source: [] for source in sources})
+    for i, source in enumerate(sources):
+        for n in range(count):
+            lister.publish(source, video_id(i * 100 + n), updated="1")
+    return lister
+
+def test_first_sync_processes_every_listed_video(store_dir):
+    process = Recorder()
+    report = sync([CHANNEL, PLAYLIST], lister_with(CHANNEL, PLAYLIST), store_dir, process=process)
+    assert report["pending"] == report["succeeded"] == 6
+    assert sorted(process.processed) == sorted(video_id(n) for n in (0, 1, 2, 100, 101, 102))
+
+def test_unchanged_sources_process_nothing(store_dir):
+    lister = lister_with(CHANNEL, PLAYLIST)
+    sync([CHANNEL, PLAYLIST], lister, store_dir, process=Recorder())
+    process = Recorder()
+    report = sync([CHANNEL, PLAYLIST], lister, store_dir, process=process)
+    assert report["unchanged_sources"] == 2
+    assert report["pending"] == 0
+    assert process.processed == []
+
+def test_only_new_and_changed_videos_are_processed(store_dir):
+    lister = lister_with(CHANNEL, PLAYLIST)
+    sync([CHANNEL, PLAYLIST], lister, store_dir, process=Recorder())
+    lister.publish(CHANNEL, video_id(50), updated="1")
+    lister.publish(PLAYLIST, video_id(100), title="Renamed", updated="2")
+    process = Recorder()
+    report = sync([CHANNEL, PLAYLIST], lister, store_dir, process=process)
+    assert report["unchanged_sources"] == 0
+    assert sorted(process.processed) == [video_id(50), video_id(100)]
+
+def test_failed_source_is_reported_and_others_still_sync(store_dir):
+    process = Recorder()
+    report = sync([CHANNEL, MISSING], lister_with(CHANNEL), store_dir, process=process)
+    assert list(report["errors"]) == [MISSING]
+    assert report["succeeded"] == 3
+    assert len(process.processed) == 3
+
+def test_failed_video_is_retried_on_next_sync(store_dir):
+    lister = lister_with(CHANNEL)
+    report = sync([CHANNEL], lister, store_dir, process=Recorder(fail={video_id(1)}))
+    assert report["failed"] == 1
+    # The source kept its old state, so the unchanged feed is listed again and only the failure reruns
+    process = Recorder()
+    report = sync([CHANNEL], lister, store_dir, process=process)
+    assert process.processed == [video_id(1)]
+    assert report["failed"] == 0
+
+def test_dry_run_changes_nothing(store_dir):
+    lister = lister_with(CHANNEL)
+    report = sync([CHANNEL], lister, store_dir, process=Recorder(), dry_run=True)
+    assert [v["status"] for v in report["videos"]] == ["pending"] * 3
+    process = Recorder()
+    sync([CHANNEL], lister, store_dir, process=process)
+    assert len(process.processed) == 3
+
+def test_cut_off_listing_is_reported(store_dir):
+    lister = lister_with(CHANNEL, count=20)
+    lister.page_limit = 15
+    report = sync([CHANNEL], lister, store_dir, process=Recorder(), backfill=False)
+    assert report["truncated"] == [CHANNEL]
+    assert report["succeeded"] == 15
+
+def test_cut_off_listing_is_backfilled_up_to_known_videos(store_dir):
+    lister = lister_with(CHANNEL, count=5)
+    sync([CHANNEL], lister, store_dir, process=Recorder())
+    for n in range(5, 25):
+        lister.publish(CHANNEL, video_id(n), updated="1")
+    lister.page_limit = 15
+    process = Recorder()
+    report = sync([CHANNEL], lister, store_dir, process=process, backfill=lister)
+    assert report["truncated"] == []
+    assert sorted(process.processed) == [video_id(n) for n in range(5, 25)]
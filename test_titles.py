@@ -0,0 +1,59 @@
+import asyncio
+import os
+
+import pytest
+
+import Youtube_transcript_translate as ytt
+import async_pipeline
+import http_client
+from async_pipeline import AsyncPipeline
+from fakes import FakeUpstream
+from http_client import PooledSession
+from metadata import get_metadata_cache
+from scheduler import FetchScheduler
+
+VIDEO = "aaaaaaaaaaA"
+
+@pytest.fixture
+def store_dir(tmp_path, monkeypatch):
+    monkeypatch.delenv("TRANSCRIPTS_DB", raising=False)
+    monkeypatch.chdir(tmp_path)
+    # No retries, so every scripted response reaches the title policy
+    monkeypatch.setattr(http_client, "_session", PooledSession(pool_size=2, scheduler=FetchScheduler(retries=0)))
+    return str(tmp_path / "out")
+
+def point_at(upstream, monkeypatch):
+    monkeypatch.setattr(ytt, "OEMBED_URL", upstream.url + "/oembed?v={video_id}")
+    monkeypatch.setattr(ytt, "WATCH_URL", upstream.url + "/watch?v={video_id}")
+    monkeypatch.setattr(async_pipeline, "OEMBED_URL", upstream.url + "/oembed?v={video_id}")
+    monkeypatch.setattr(async_pipeline, "WATCH_URL", upstream.url + "/watch?v={video_id}")
+
+def async_title(video_id, dir_path):
+    async def run():
+        pipeline = AsyncPipeline(dir_path, scheduler=FetchScheduler(retries=0))
+        return await pipeline.get_video_title(video_id)
+    return asyncio.run(run())
+
+@pytest.mark.parametrize("lookup", [ytt.get_video_title, async_title])
+def test_title_is_cached_in_the_given_directory(store_dir, monkeypatch, lookup):
+    with FakeUpstream() as upstream:
+        point_at(upstream, monkeypatch)
+        assert lookup(VIDEO, store_dir) == "Fake video"
+        assert lookup(VIDEO, store_dir) == "Fake video"
+        assert len(upstream.requests) == 1
+    assert get_metadata_cache(store_dir).get(VIDEO)["title"] == "Fake video"
+    assert not os.path.exists("transcripts")
+
+@pytest.mark.parametrize("lookup", [ytt.get_video_title, async_title])
+def test_only_definitive_misses_are_negative_cached(store_dir, monkeypatch, lookup):
+    script = [(429, {}, {}), (503, {}, {}), (404, {}, {}), (404, {}, {})]
+    with FakeUpstream(script, default=b"no title here") as upstream:
+        point_at(upstream, monkeypatch)
+        # Throttled on both steps, so the next lookup tries again
+        assert lookup(VIDEO, store_dir) == f"video_{VIDEO}"
+        assert get_metadata_cache(store_dir).get(VIDEO) is None
+        assert lookup(VIDEO, store_dir) == f"video_{VIDEO}"
+        assert get_metadata_cache(store_dir).get(VIDEO) == {"title": None, "author": None, "source": "missing"}
+        requests = len(upstream.requests)
+        assert lookup(VIDEO, store_dir) == f"video_{VIDEO}"
+        assert len(upstream.requests) == requests
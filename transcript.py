@@ -0,0 +1,118 @@
+from array import array
+from bisect import bisect_left, bisect_right
+from collections import namedtuple
+from itertools import accumulate
+
+Segment = namedtuple("Segment", ["text", "start", "duration"])
+
+def parse_timestamp(value):
+    # Seconds ("2400", "2400.5") or clock time ("40:00", "1:02:03")
+    seconds = 0.0
+    for part in str(value).strip().split(":"):
+        seconds = seconds * 60 + float(part)
+    if seconds < 0:
+        raise ValueError(f"Negative timestamp: {value}")
+    return seconds
+
+def _field(item, name, default):
+    if isinstance(item, dict):
+        return item.get(name, default)
+    return getattr(item, name, default)
+
+class Transcript:
+    # Segment texts live in one buffer joined by single spaces (plus a trailing space) so that
+    # segment i is buffer[offsets[i]:offsets[i + 1] - 1] and any run of segments is a single slice.
+    # Slices share the arrays and buffer of their parent and only narrow the [lo, hi) window.
+    __slots__ = ("buffer", "offsets", "starts", "durations", "lo", "hi")
+
+    def __init__(self, buffer, offsets, starts, durations, lo=0, hi=None):
+        self.buffer = buffer
+        self.offsets = offsets
+        self.starts = starts
+        self.durations = durations
+        self.lo = lo
+        self.hi = len(starts) if hi is None else hi
+
+    @classmethod
+    def from_texts(cls, texts, starts, durations):
+        texts = [str(t) for t in texts]
+        buffer = " ".join(texts) + " " if texts else ""
+        offsets = array('q', accumulate((len(t) + 1 for t in texts), initial=0))
+        return cls(buffer, offsets, array('d', starts), array('d', durations))
+
+    @classmethod
+    def from_timings(cls, text, offsets, starts, durations):
+        # Inverse of timings(): `text` is exactly what text() returned, so nothing is re-split
+        return cls(text + " ", offsets, starts, durations)
+
+    @classmethod
+    def from_segments(cls, items):
+        if isinstance(items, Transcript):
+            return items
+        texts, starts, durations = [], array('d'), array('d')
+        for item in items:
+            texts.append(_field(item, "text", "") or "")
+            starts.append(float(_field(item, "start", 0.0) or 0.0))
+            durations.append(float(_field(item, "duration", 0.0) or 0.0))
+        return cls.from_texts(texts, starts, durations)
+
+    def __len__(self):
+        return self.hi - self.lo
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            lo, hi, step = index.indices(len(self))
+            if step != 1:
+                raise ValueError("Transcript slices must be contiguous")
+            return Transcript(self.buffer, self.offsets, self.starts, self.durations,
+                              self.lo + lo, self.lo + max(lo, hi))
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError("Transcript index out of range")
+        i = self.lo + index
+        return Segment(self.buffer[self.offsets[i]:self.offsets[i + 1] - 1], self.starts[i], self.durations[i])
+
+    def __iter__(self):
+        buffer, offsets, starts, durations = self.buffer, self.offsets, self.starts, self.durations
+        for i in range(self.lo, self.hi):
+            yield Segment(buffer[offsets[i]:offsets[i + 1] - 1], starts[i], durations[i])
+
+    def __repr__(self):
+        return f"<Transcript {len(self)} segments, {self.offsets[self.hi] - self.offsets[self.lo]} chars>"
+
+    def text(self):
+        if self.hi <= self.lo:
+            return ""
+        return self.buffer[self.offsets[self.lo]:self.offsets[self.hi] - 1]
+
+    def texts(self):
+        buffer, offsets = self.buffer, self.offsets
+        return [buffer[offsets[i]:offsets[i + 1] - 1] for i in range(self.lo, self.hi)]
+
+    def timings(self):
+        # Offsets rebased to this view's text(), plus the start and duration of every segment
+        base = self.offsets[self.lo]
+        offsets = self.offsets[self.lo:self.hi + 1]
+        if base:
+            offsets = array('q', (o - base for o in offsets))
+        return offsets, self.starts[self.lo:self.hi], self.durations[self.lo:self.hi]
+
+    def between(self, start, end):
+        # Segments overlapping [start, end) seconds, by binary search over the sorted start times
+        starts = self.starts
+        lo = bisect_right(starts, start, self.lo, self.hi) - 1
+        if lo < self.lo or starts[lo] + self.durations[lo] <= start:
+            lo += 1
+        hi = bisect_left(starts, end, lo, self.hi)
+        return self[lo - self.lo:max(lo, hi) - self.lo]
+
+    def with_texts(self, texts):
+        return Transcript.from_texts(texts, self.starts[self.lo:self.hi], self.durations[self.lo:self.hi])
+
+    def to_dicts(self):
+        return [s._asdict() for s in self]
+
+    def nbytes(self):
+        return (len(self.buffer) * (1 if self.buffer.isascii() else 4) + self.offsets.itemsize * len(self.offsets)
+                + self.starts.itemsize * len(self.starts) + self.durations.itemsize * len(self.durations))
@@ -0,0 +1,180 @@
+import hashlib
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from scheduler import get_scheduler
+from store import get_store
+
+DELIMITER = "\n"
+TRANSLATE_HOST = "translate.googleapis.com"
+
+MEMO_SCHEMA = """
+CREATE TABLE IF NOT EXISTS translation_memo (
+    key TEXT PRIMARY KEY,
+    text TEXT NOT NULL
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS translation_checkpoints (
+    job TEXT NOT NULL,
+    seg_index INTEGER NOT NULL,
+    text TEXT NOT NULL,
+    PRIMARY KEY (job, seg_index)
+) WITHOUT ROWID;
+"""
+
+class TranslationError(Exception):
+    pass
+
+def memo_key(text, src, dest):
+    return hashlib.sha1(f"{src}\0{dest}\0{text}".encode('utf-8')).hexdigest()
+
+class TranslationMemo:
+    # Content-hash memo shared by every video, plus per-job checkpoints of translated segment indexes
+    def __init__(self, store):
+        self.store = store
+        with store._connect() as conn:
+            conn.executescript(MEMO_SCHEMA)
+
+    def get_many(self, keys):
+        found = {}
+        conn = self.store._connect()
+        keys = list(keys)
+        for i in range(0, len(keys), 500):
+            chunk = keys[i:i + 500]
+            rows = conn.execute(f"SELECT key, text FROM translation_memo WHERE key IN ({','.join('?' * len(chunk))})",
+                                chunk).fetchall()
+            found.update((row["key"], row["text"]) for row in rows)
+        return found
+
+    def save(self, memo_items, job=None, segments=()):
+        with self.store._connect() as conn:
+            conn.executemany("INSERT OR REPLACE INTO translation_memo (key, text) VALUES (?, ?)", memo_items)
+            if job:
+                conn.executemany("INSERT OR REPLACE INTO translation_checkpoints (job, seg_index, text) VALUES (?, ?, ?)",
+                                 [(job, i, text) for i, text in segments])
+
+    def load_checkpoint(self, job):
+        rows = self.store._connect().execute("SELECT seg_index, text FROM translation_checkpoints WHERE job = ?",
+                                             (job,)).fetchall()
+        return {row["seg_index"]: row["text"] for row in rows}
+
+    def clear_checkpoint(self, job):
+        with self.store._connect() as conn:
+            conn.execute("DELETE FROM translation_checkpoints WHERE job = ?", (job,))
+
+_memos = {}
+_memo_lock = threading.Lock()
+
+def get_translation_memo(dir_path=None):
+    store = get_store(dir_path)
+    if store.path not in _memos:
+        with _memo_lock:
+            if store.path not in _memos:
+                _memos[store.path] = TranslationMemo(store)
+    return _memos[store.path]
+
+class TranslationEngine:
+    def __init__(self, translator=None, max_chars=None, workers=None, delimiter=DELIMITER, memo=None, retries=None,
+                 scheduler=None):
+        self.translator = translator
+        self.memo = memo
+        self.retries = int(os.environ.get("TRANSLATE_RETRIES", 2)) if retries is None else retries
+        self.scheduler = scheduler or get_scheduler()
+        # Injected translators get their own breaker so a fake or alternate backend never trips Google's
+        self.host = TRANSLATE_HOST if translator is None else type(translator).__name__
+        self.max_chars = max_chars or int(os.environ.get("TRANSLATE_MAX_CHARS", 4500))
+        self.workers = workers or int(os.environ.get("TRANSLATE_WORKERS", 8))
+        self.delimiter = delimiter
+        self._local = threading.local()
+
+    def _translator(self):
+        if self.translator is not None:
+            return self.translator
+        translator = getattr(self._local, "translator", None)
+        if translator is None:
+            from googletrans import Translator
+            translator = self._local.translator = Translator()
+        return translator
+
+    def pack(self, texts):
+        batches = []
+        start, size = 0, 0
+        for i, text in enumerate(texts):
+            cost = len(text) + len(self.delimiter)
+            if i > start and size + cost > self.max_chars:
+                batches.append((start, i))
+                start, size = i, 0
+            size += cost
+        if start < len(texts):
+            batches.append((start, len(texts)))
+        return batches
+
+    def _send(self, text, src, dest):
+        return self._translator().translate(text, src=src, dest=dest).text
+
+    def _request(self, text, src, dest):
+        return self.scheduler.call(self.host, lambda: self._send(text, src, dest), retries=self.retries)
+
+    def _translate_batch(self, texts, src, dest):
+        parts = self._request(self.delimiter.join(texts), src, dest).split(self.delimiter)
+        if len(parts) == len(texts):
+            return [p.strip() for p in parts]
+        # Segment boundaries were not preserved: fall back to one request per segment
+        return [self._request(text, src, dest).strip() for text in texts]
+
+    def translate_texts(self, texts, src, dest='en', progress=None, checkpoint=None):
+        result = [" ".join(t.split()) for t in texts]
+        positions = {}
+        done = 0
+        if checkpoint and self.memo:
+            job = f"{checkpoint}:{src}:{dest}"
+            restored = self.memo.load_checkpoint(job)
+        else:
+            job, restored = None, {}
+        for i, text in enumerate(result):
+            if not text:
+                done += 1
+            elif i in restored:
+                result[i] = restored[i]
+                done += 1
+            else:
+                # Identical lines ("[Music]", intros) are translated once per call
+                positions.setdefault(text, []).append(i)
+        if self.memo and positions:
+            keys = {text: memo_key(text, src, dest) for text in positions}
+            cached = self.memo.get_many(keys.values())
+            for text in [t for t in positions if keys[t] in cached]:
+                for i in positions.pop(text):
+                    result[i] = cached[keys[text]]
+                    done += 1
+        pending = list(positions)
+        if progress:
+            progress("translating", done, len(result))
+        failures = []
+        with ThreadPoolExecutor(max_workers=max(1, self.workers), thread_name_prefix="translate") as pool:
+            futures = {pool.submit(self._translate_batch, pending[a:b], src, dest): (a, b)
+                       for a, b in self.pack(pending)}
+            for future in as_completed(futures):
+                a, b = futures[future]
+                try:
+                    translated = future.result()
+                except Exception as e:
+                    failures.append(e)
+                    continue
+                segments = []
+                for text, out in zip(pending[a:b], translated):
+                    for i in positions[text]:
+                        result[i] = out
+                        segments.append((i, out))
+                done += len(segments)
+                if self.memo:
+                    self.memo.save([(memo_key(t, src, dest), out) for t, out in zip(pending[a:b], translated)],
+                                   job, segments)
+                if progress:
+                    progress("translating", done, len(result))
+        if failures:
+            raise TranslationError(f"{len(failures)} of {len(futures)} translation batches failed; "
+                                   f"last error: {failures[-1]!r}") from failures[-1]
+        if job:
+            self.memo.clear_checkpoint(job)
+        return result